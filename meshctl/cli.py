@@ -1,11 +1,13 @@
 """Main CLI module for meshcli."""
 
+import shlex
+
 import click
 from .discover import discover
 from .list_nodes import list_nodes
 from .ping import ping
 from .scan_ble import scan_ble
-from .connection import connect
+from .connection import address_options, shared_interface
 
 
 @click.group()
@@ -16,14 +18,48 @@ def main():
 
 
 @click.command()
-@click.option("--address", help="Device address (serial port, IP, or BLE MAC/name)")
-@click.option(
-    "--interface-type", default="auto", help="Interface type: serial, tcp, ble, or auto"
-)
-def some_command(address, interface_type):
-    """Example command using the new connection logic."""
-    connect(address=address, interface_type=interface_type)
-    # ... use iface as needed ...
+@address_options
+def shell(address, interface_type):
+    """Run several commands over a single device connection.
+
+    The device is connected once and its configuration is only fetched by
+    the first command; --address/--interface-type given to the commands run
+    inside the shell are ignored.
+    """
+    with shared_interface(address=address, interface_type=interface_type) as iface:
+        if iface is None:
+            return
+
+        click.echo("Type a command (e.g. 'list-nodes'), 'help' or 'exit'.")
+        while True:
+            try:
+                line = click.prompt(
+                    "meshctl", default="", show_default=False, prompt_suffix="> "
+                )
+                args = shlex.split(line)
+            except click.Abort:
+                click.echo()
+                break
+            except ValueError as e:
+                click.echo(f"Error: {e}", err=True)
+                continue
+
+            if not args:
+                continue
+            if args[0] in ("exit", "quit"):
+                break
+            if args[0] == "help":
+                args = ["--help"]
+            elif args[0] == "shell":
+                click.echo("Already in a shell", err=True)
+                continue
+
+            try:
+                main.main(args=args, prog_name="meshctl", standalone_mode=False)
+            except click.ClickException as e:
+                e.show()
+            except click.Abort:
+                click.echo()
 
 
 # Add the commands to the main group
@@ -31,6 +67,7 @@ main.add_command(discover)
 main.add_command(list_nodes)
 main.add_command(ping)
 main.add_command(scan_ble)
+main.add_command(shell)
 
 
 if __name__ == "__main__":
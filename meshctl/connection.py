@@ -1,47 +1,118 @@
 """Connection utilities for meshcli."""
 
+import ipaddress
 import re
 import platform
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
 import click
-import meshtastic.serial_interface
-import meshtastic.tcp_interface
-import meshtastic.ble_interface
 
+# Interface handed out by connect() while a shared session is open
+_shared_interface = None
+
+_MAC_RE = re.compile(r"^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5}$")
+_TCP_RE = re.compile(
+    r"^(?:"
+    r"localhost"
+    r"|[A-Za-z0-9_-]+(?:\.[A-Za-z0-9_-]+)+\.?"  # IPv4 and dotted hostnames
+    r")$"
+)
+
+
+def _is_ip_address(address: str) -> bool:
+    """Return True for IP addresses, also bracketed or with an IPv6 zone id."""
+    try:
+        # ipaddress only accepts zone ids from Python 3.9 on
+        ipaddress.ip_address(address.strip("[]").split("%")[0])
+    except ValueError:
+        return False
+    return True
+
+
+# Address each TCP hostname last connected to, tried first when reconnecting
+_tcp_peers = {}
+
+
+@lru_cache(maxsize=None)
+def _tcp_interface_class():
+    """Return a TCPInterface that reuses the address its hostname connected to.
+
+    Reconnecting to the same device, as discover and ping do on every
+    --repeat run, then skips the DNS lookup. If that address no longer
+    answers, e.g. after a new DHCP lease, the name is resolved again and
+    each of its addresses is tried in turn.
+    """
+    import meshtastic.tcp_interface
+
+    class TCPInterface(meshtastic.tcp_interface.TCPInterface):
+        def __init__(self, hostname, **kwargs):
+            self._name = hostname
+            super().__init__(hostname=hostname, **kwargs)
+
+        def myConnect(self):
+            # Only the socket is opened here, so configuration errors still
+            # reach the caller instead of triggering a retry by name
+            peer = _tcp_peers.get(self._name)
+            if peer is not None:
+                self.hostname = peer
+                try:
+                    return super().myConnect()
+                except OSError:
+                    _tcp_peers.pop(self._name, None)
+            self.hostname = self._name
+            super().myConnect()
+            try:
+                address = self.socket.getpeername()[0]
+            except OSError:
+                return
+            if address != self._name:
+                _tcp_peers[self._name] = address
 
+    return TCPInterface
+
+
+@lru_cache(maxsize=128)
 def detect_interface_type(address: str) -> str:
     """Auto-detect interface type based on address format."""
     if not address or address == "any":
         return "ble"  # Default to BLE for auto-discovery
     if address.startswith("/dev/"):
         return "serial"
-    # IP addresses (IPv4 and IPv6)
-    if (
-        re.match(r"^\d{1,3}(\.\d{1,3}){3}$", address)
-        or ":" in address
-        and "::" in address
-    ):
-        return "tcp"
-    # Hostnames (contain dots or are common hostnames)
-    if "." in address or address in ["localhost", "meshtastic.local"]:
-        return "tcp"
-    # BLE MAC address format (XX:XX:XX:XX:XX:XX)
-    if re.match(r"^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5}$", address):
+    # BLE MAC address format (XX:XX:XX:XX:XX:XX), checked before IPv6
+    if _MAC_RE.match(address):
         return "ble"
+    # IP addresses (IPv4 and IPv6) and hostnames
+    if _is_ip_address(address) or _TCP_RE.match(address):
+        return "tcp"
     # Default to BLE for other formats (device names, UUIDs, etc.)
     return "ble"
 
 
-def connect(address: str = None, interface_type: str = "auto", **kwargs):
-    """Create and return the appropriate interface based on type or auto-detect."""
+def connect(address: str = None, interface_type: str = "auto", echo=None, **kwargs):
+    """Create and return the appropriate interface based on type or auto-detect.
+
+    While a shared_interface() session is open, its interface is returned
+    instead of opening a new connection. Messages go through ``echo``, which
+    defaults to click.echo.
+    """
+    echo = echo or click.echo
+    if _shared_interface is not None:
+        return _shared_interface
     if interface_type == "auto":
         interface_type = detect_interface_type(address)
+    # meshtastic and its transports are slow to import, so only load the
+    # one that is actually needed
     try:
         if interface_type == "serial":
+            import meshtastic.serial_interface
+
             if address:
                 # On Darwin, recommend /dev/cu.* over /dev/tty.* for outbound connections
                 if platform.system() == "Darwin" and address.startswith("/dev/tty."):
                     cu_address = address.replace("/dev/tty.", "/dev/cu.")
-                    click.echo(
+                    echo(
                         f"Note: On macOS, consider using {cu_address} instead of {address} for better compatibility",
                         err=True,
                     )
@@ -51,9 +122,12 @@ def connect(address: str = None, interface_type: str = "auto", **kwargs):
             else:
                 return meshtastic.serial_interface.SerialInterface(**kwargs)
         elif interface_type == "tcp":
-            hostname = address or "meshtastic.local"
-            return meshtastic.tcp_interface.TCPInterface(hostname=hostname, **kwargs)
+            return _tcp_interface_class()(
+                hostname=(address or "meshtastic.local").strip("[]"), **kwargs
+            )
         elif interface_type == "ble":
+            import meshtastic.ble_interface
+
             if address:
                 return meshtastic.ble_interface.BLEInterface(address=address, **kwargs)
             else:
@@ -61,21 +135,164 @@ def connect(address: str = None, interface_type: str = "auto", **kwargs):
         else:
             raise ValueError(f"Unknown interface_type: {interface_type}")
     except Exception as e:
-        click.echo(f"Failed to connect: {e}", err=True)
+        echo(f"Failed to connect: {e}", err=True)
         return None
 
 
-def address_options(func):
-    """Decorator to add address and interface-type options to a click command."""
-    func = click.option(
-        "--interface-type",
-        default="auto",
-        show_default=True,
-        help="Interface type: serial, tcp, ble, or auto",
-    )(func)
-    func = click.option(
-        "--address",
-        default=None,
-        help="Device address (serial port, IP, or BLE MAC/name)",
-    )(func)
-    return func
+def wait_for_config(interface, timeout=None, start=False):
+    """Wait for the device configuration, for up to ``timeout`` seconds.
+
+    With ``start``, the interface was created with ``connectNow=False`` and
+    is connected first, within the same timeout. Returns False if the
+    configuration didn't arrive in time. Without a timeout, waits for as long
+    as meshtastic does.
+
+    On timeout the waiting thread is left behind, and exits once the
+    configuration arrives or the interface is closed. Errors it hits after
+    that are dropped, as nobody is waiting for them anymore.
+    """
+    if timeout is None:
+        if start:
+            interface.connect()
+        interface.waitForConfig()
+        return True
+
+    errors = []
+
+    def wait():
+        try:
+            if start:
+                interface.connect()
+            interface.waitForConfig()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if errors:
+        raise errors[0]
+    return not thread.is_alive()
+
+
+def open_interface_with_status(
+    address=None, interface_type="auto", connect_timeout=None, echo=None
+):
+    """Connect to a device and wait for its configuration.
+
+    Returns ``(interface, config_complete)``; the interface is None if it
+    could not be set up. When ``connect_timeout`` runs out, the interface is
+    still used if part of the node database has already arrived, and
+    config_complete is False. Status and errors go through ``echo``, which
+    defaults to click.echo.
+    """
+    echo = echo or click.echo
+    # Serial and TCP interfaces otherwise wait for the configuration in their
+    # constructor, with meshtastic's own timeout; BLE ones always do
+    detected_type = (
+        detect_interface_type(address) if interface_type == "auto" else interface_type
+    )
+    start = (
+        connect_timeout is not None
+        and detected_type in ("serial", "tcp")
+        and not in_shared_session()
+    )
+    kwargs = {"connectNow": False} if start else {}
+    interface = connect(
+        address=address, interface_type=interface_type, echo=echo, **kwargs
+    )
+    if interface is None:
+        echo("Failed to connect", err=True)
+        return None, False
+    try:
+        config_complete = wait_for_config(interface, connect_timeout, start=start)
+        if not config_complete:
+            # The node database fills in as the config arrives, so a
+            # partial one is still worth showing
+            if not interface.nodesByNum:
+                echo(
+                    "Failed to connect: no configuration received within "
+                    f"{connect_timeout} seconds",
+                    err=True,
+                )
+                close(interface)
+                return None, False
+            echo(
+                f"Warning: configuration not complete after {connect_timeout}"
+                " seconds, the node list may be partial",
+                err=True,
+            )
+        echo("Connected to Meshtastic device")
+        return interface, config_complete
+    except Exception as e:
+        echo(f"Failed to connect: {e}", err=True)
+        close(interface)
+        return None, False
+
+
+def open_interface(
+    address=None, interface_type="auto", connect_timeout=None, echo=None
+):
+    """Like open_interface_with_status(), returning only the interface."""
+    interface, _ = open_interface_with_status(
+        address, interface_type, connect_timeout, echo
+    )
+    return interface
+
+
+def in_shared_session():
+    """Return True while a shared_interface() session is open."""
+    return _shared_interface is not None
+
+
+def close(interface):
+    """Close an interface returned by connect(), unless it is shared."""
+    if interface is not None and interface is not _shared_interface:
+        interface.close()
+
+
+@contextmanager
+def shared_interface(address=None, interface_type="auto"):
+    """Open one interface and reuse it for every connect() call until exit.
+
+    Yields the interface, or None if the connection could not be made.
+    """
+    global _shared_interface
+    interface = connect(address=address, interface_type=interface_type)
+    if interface is None:
+        yield None
+        return
+
+    _shared_interface = interface
+    try:
+        yield interface
+    finally:
+        _shared_interface = None
+        interface.close()
+
+
+def address_options(func=None, *, multiple=False):
+    """Decorator to add address and interface-type options to a click command.
+
+    With ``multiple``, --address can be repeated and is passed as a tuple.
+    """
+
+    def decorate(func):
+        func = click.option(
+            "--interface-type",
+            default="auto",
+            show_default=True,
+            help="Interface type: serial, tcp, ble, or auto",
+        )(func)
+        func = click.option(
+            "--address",
+            default=None,
+            multiple=multiple,
+            help="Device address (serial port, IP, or BLE MAC/name)"
+            + ("; repeat to use several devices" if multiple else ""),
+        )(func)
+        return func
+
+    if func is None:
+        return decorate
+    return decorate(func)
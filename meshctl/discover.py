@@ -1,10 +1,10 @@
 """Discovery functionality for meshcli."""
 
+import signal
+import threading
 import time
 
 import click
-from meshtastic import BROADCAST_ADDR
-from pubsub import pub
 from rich.panel import Panel
 from rich.progress import (
     Progress,
@@ -13,9 +13,15 @@ from rich.progress import (
     BarColumn,
     TimeElapsedColumn,
 )
+from rich.text import Text
 
 from .connection import address_options
-from .traceroute import TracerouteBase
+from .traceroute import PROGRESS_INTERVAL, TracerouteBase
+
+
+def _snr_rank(snr):
+    """Sort key for SNR values, "Unknown" and "Forwarded" rank lowest."""
+    return snr if isinstance(snr, (int, float)) else float("-inf")
 
 
 class NearbyNodeDiscoverer(TracerouteBase):
@@ -26,18 +32,29 @@ class NearbyNodeDiscoverer(TracerouteBase):
         debug=False,
         test_run_id=None,
         csv_file=None,
+        verbose_packets=False,
     ):
         super().__init__(interface_type, device_path, debug, test_run_id, csv_file)
-        self.nearby_nodes = []
+        self.verbose_packets = verbose_packets
+        self.nearby_nodes = {}
+        self._count = 0
         self.discovery_active = False
+        self._table = self.new_results_table()
+        self._table_stale = False
+        self._wake = threading.Event()
+        self._interrupted = False
 
     def on_traceroute_response(self, packet, interface):
         """Handle traceroute responses during discovery"""
-        if not self.active:
+        if not self.active or self.is_duplicate_packet(packet):
             return
 
-        # Pretty print the packet details only in debug mode
-        if self.debug:
+        # Panels for this packet, printed together in a single console write
+        renderables = []
+
+        # Pretty print the full packet details only when asked for and shown on
+        # a terminal, otherwise use a one-line summary which is much cheaper
+        if self.verbose_packets and self.console.is_terminal:
             packet_details = self.format_packet_details(packet)
             content = "\n".join(packet_details)
 
@@ -47,103 +64,101 @@ class NearbyNodeDiscoverer(TracerouteBase):
                 border_style="blue",
                 padding=(0, 1),
             )
-            self.console.print(panel)
-
-        if packet.get("decoded", {}).get("portnum") == "TRACEROUTE_APP":
-            sender_id = packet.get("fromId", f"!{packet.get('from', 0):08x}")
-            snr = packet.get("rxSnr", "Unknown")
-            rssi = packet.get("rxRssi", "Unknown")
-            rnode = packet.get("relay_node")
-
-            # Check if this is a forwarded packet (SNR back entries > 1)
-            traceroute = packet.get("decoded", {}).get("traceroute", {})
-            snr_back = traceroute.get("snrBack", []) if traceroute else []
-            is_forwarded_packet = len(snr_back) > 1
-
-            # Extract snrTowards values from traceroute data
-            snr_towards = None
-            if traceroute and "snrTowards" in traceroute:
-                snr_towards_raw = traceroute["snrTowards"]
-                if snr_towards_raw and len(snr_towards_raw) > 1:
-                    # Convert raw values to dB by dividing by 4.0, skip first 0.0
-                    snr_towards = snr_towards_raw[-1] / 4.0
-
-            # Skip SNR consideration if this is a forwarded packet
-            if is_forwarded_packet:
-                snr = "Forwarded"
-                rssi = "Forwarded"
-
-            # Format display name with known node info
-            display_name = self.format_node_display(sender_id, self.known_nodes)
-
-            # Format relay node display
-            relay_display = ""
-            if rnode is not None:
-                relay_hex = f"______{rnode:02x}"
-                relay_display = f" via relay 0x{relay_hex}"
-
-                # Find candidate nodes
-                candidates = self.find_relay_candidates(rnode)
-                if candidates:
-                    candidate_names = [cand["name"] for cand in candidates]
-                    relay_display += f" (candidates: {', '.join(candidate_names)})"
-
-            # Create content for the panel
-            content = f"[bold cyan]Node:[/bold cyan] {display_name}{relay_display}\n"
-
-            if snr != "Unknown":
-                if snr_towards is not None:
-                    content += f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm, SNR_towards={snr_towards}dB"
-                else:
-                    content += (
-                        f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm"
-                    )
+            renderables.append(panel)
+        elif self.debug or self.verbose_packets:
+            renderables.append(Text(self.format_packet_summary(packet), style="blue"))
 
-            # Create a beautiful panel for the discovery output
-            panel = Panel(
-                content,
-                title="[bold green]📡 Nearby Node Discovered[/bold green]",
-                border_style="green",
-                padding=(0, 1),
-            )
-            self.console.print(panel)
-
-            self.nearby_nodes.append(
-                {
-                    "id": sender_id,
-                    "from_num": packet.get("from"),
-                    "snr": snr,
-                    "rssi": rssi,
-                    "snr_towards": snr_towards,
-                    "timestamp": time.time(),
-                    "packet": packet,
-                }
-            )
+        # meshtastic only publishes TRACEROUTE_APP packets on this topic
+        sender_id, snr, rssi, snr_towards, rnode = self.parse_response(
+            packet, packet["decoded"]
+        )
+        content = self.format_response_content(
+            "Node", sender_id, snr, rssi, snr_towards, rnode
+        )
+
+        # Create a beautiful panel for the discovery output
+        panel = Panel(
+            content,
+            title="[bold green]📡 Nearby Node Discovered[/bold green]",
+            border_style="green",
+            padding=(0, 1),
+        )
+        renderables.append(panel)
+        self.console.print(*renderables)
+
+        node = self.make_node_record(
+            sender_id, packet.get("from"), snr, rssi, snr_towards
+        )
+        # Nodes often answer more than once, keep their strongest response
+        existing = self.nearby_nodes.get(sender_id)
+        if existing is None:
+            self.nearby_nodes[sender_id] = node
+            self._count += 1
+            # Rows are added as responses arrive, so the report is ready when done
+            self.add_results_row(self._table, node)
+        elif _snr_rank(snr) > _snr_rank(existing.snr):
+            self.nearby_nodes[sender_id] = node
+            # Table rows can't be replaced, rebuild it when reporting
+            self._table_stale = True
+
+        # Wake up the listen loop in discover_nearby_nodes
+        self._wake.set()
+
+    def _on_interrupt(self, signum, frame):
+        """Stop listening on Ctrl-C, keeping the responses heard so far."""
+        self._interrupted = True
+        self._wake.set()
+
+    def discover_nearby_nodes(
+        self, duration=60, current_run=None, total_runs=None, max_nodes=None
+    ):
+        """Send 0-hop traceroute and listen for responses.
+
+        Listening stops after ``duration`` seconds, or as soon as ``max_nodes``
+        nearby nodes have responded when it is given.
+        """
+        from meshtastic import BROADCAST_ADDR
 
-    def discover_nearby_nodes(self, duration=60, current_run=None, total_runs=None):
-        """Send 0-hop traceroute and listen for responses"""
         if not self.connect():
             return []
 
+        sigint_installed = False
+        previous_sigint = None
         try:
             # Get known nodes first
             self.known_nodes = self.get_known_nodes()
+            self.index_relay_candidates()
 
             # Subscribe to traceroute responses
-            pub.subscribe(self.on_traceroute_response, "meshtastic.receive.traceroute")
+            self.subscribe_responses()
 
             self.active = True
-            self.nearby_nodes = []
-
-            click.echo("🔍 Starting interactive nearby node discovery...")
-            click.echo(f"   Listening for responses for {duration} seconds...")
-            click.echo("   Using 0-hop traceroute to broadcast address")
+            self.nearby_nodes = {}
+            self._count = 0
+            self._table = self.new_results_table()
+            self._table_stale = False
+            self._interrupted = False
+            self._wake.clear()
+
+            click.echo(
+                "🔍 Starting interactive nearby node discovery...\n"
+                f"   Listening for responses for {duration} seconds...\n"
+                "   Using 0-hop traceroute to broadcast address"
+            )
 
             # Send traceroute packet
             packet = self.send_traceroute(BROADCAST_ADDR, hop_limit=0)
 
-            click.echo(f"   Packet ID: {packet.id}")
-            click.echo("\n📻 Listening for nearby node responses...")
+            click.echo(
+                f"   Packet ID: {packet.id}\n"
+                "\n📻 Listening for nearby node responses..."
+            )
+
+            # Ctrl-C ends the listen loop so the results are still reported;
+            # signal handlers can only be installed from the main thread
+            if threading.current_thread() is threading.main_thread():
+                previous_sigint = signal.signal(signal.SIGINT, self._on_interrupt)
+                sigint_installed = True
 
             # Listen for responses with progress bar
             with Progress(
@@ -164,46 +179,61 @@ class NearbyNodeDiscoverer(TracerouteBase):
 
                 task = progress.add_task(description, total=duration)
 
-                start_time = time.time()
-                while time.time() - start_time < duration:
-                    elapsed = time.time() - start_time
-                    progress.update(task, completed=elapsed)
-                    time.sleep(0.1)  # More frequent updates for smoother progress bar
-
+                start_time = time.monotonic()
+                deadline = start_time + duration
+                while (remaining := deadline - time.monotonic()) > 0:
+                    # Block until a response arrives or the progress bar is due
+                    if self._wake.wait(min(remaining, PROGRESS_INTERVAL)):
+                        self._wake.clear()
+                        if self._interrupted:
+                            break
+                        if max_nodes and self._count >= max_nodes:
+                            progress.update(task, completed=duration)
+                            break
+                    progress.update(task, completed=time.monotonic() - start_time)
+
+            # Ctrl-C interrupts reporting as usual again
+            if sigint_installed:
+                signal.signal(signal.SIGINT, previous_sigint)
+                sigint_installed = False
             self.active = False
 
+            if self._interrupted:
+                click.echo("\n⏹️  Discovery interrupted by user")
+
             # Report results
-            nearby_count = len(self.nearby_nodes)
-            if self.nearby_nodes:
-                # Create a table for the results
-                table = self.create_results_table(
-                    self.nearby_nodes,
-                    self.known_nodes,
-                    f"\n📊 Discovery complete! Found {nearby_count} nearby nodes:",
-                )
-                self.console.print(table)
+            nearby_nodes = list(self.nearby_nodes.values())
+            nearby_count = len(nearby_nodes)
+            if nearby_nodes:
+                title = f"\n📊 Discovery complete! Found {nearby_count} nearby nodes:"
+                if self._table_stale:
+                    self._table = self.create_results_table(nearby_nodes, title)
+                else:
+                    self._table.title = title
+                self.console.print(self._table)
 
                 # Append to CSV if requested
                 if self.csv_file:
-                    self.append_to_csv(self.nearby_nodes, self.known_nodes)
+                    self.append_to_csv(nearby_nodes)
             else:
                 click.echo("  No nearby nodes detected or they didn't " "respond.")
 
-            return self.nearby_nodes
+            return nearby_nodes
 
         except KeyboardInterrupt:
             click.echo("\n⏹️  Discovery interrupted by user")
-            return self.nearby_nodes
+            return list(self.nearby_nodes.values())
         except Exception as e:
             click.echo(f"Error during interactive discovery: {e}", err=True)
             return []
         finally:
+            # Only still installed if listening ended with an error
+            if sigint_installed:
+                signal.signal(signal.SIGINT, previous_sigint)
             self.active = False
-            pub.unsubscribe(
-                self.on_traceroute_response, "meshtastic.receive.traceroute"
-            )
-            if self.interface:
-                self.interface.close()
+            self.unsubscribe_responses()
+            self._wake.clear()
+            self.close()
 
 
 @click.command()
@@ -214,7 +244,14 @@ class NearbyNodeDiscoverer(TracerouteBase):
     default=45,
     help="How long to listen for responses (seconds)",
 )
-@click.option("--debug", is_flag=True, help="Enable debug mode to show packet details")
+@click.option(
+    "--debug", is_flag=True, help="Enable debug mode to show a summary of each packet"
+)
+@click.option(
+    "--verbose-packets",
+    is_flag=True,
+    help="Show the full details of each received packet",
+)
 @click.option("--id", help="Test run ID to include in results table")
 @click.option(
     "--append-to-csv",
@@ -229,8 +266,23 @@ class NearbyNodeDiscoverer(TracerouteBase):
     default=300,
     help="Time interval between repeats in seconds (includes test runtime)",
 )
+@click.option(
+    "--max-nodes",
+    type=int,
+    default=None,
+    help="Stop listening as soon as this many nearby nodes have responded",
+)
 def discover(
-    address, interface_type, duration, debug, id, append_to_csv, repeat, repeat_time
+    address,
+    interface_type,
+    duration,
+    debug,
+    verbose_packets,
+    id,
+    append_to_csv,
+    repeat,
+    repeat_time,
+    max_nodes,
 ):
     """Discover nearby Meshtastic nodes using 0-hop traceroute."""
 
@@ -255,12 +307,16 @@ def discover(
             debug=debug,
             test_run_id=id,
             csv_file=append_to_csv,
+            verbose_packets=verbose_packets,
         )
 
         click.echo(f"Listening for responses for {duration} seconds...")
         run_start_time = time.time()
         nearby_nodes = discoverer.discover_nearby_nodes(
-            duration=duration, current_run=run_number, total_runs=repeat
+            duration=duration,
+            current_run=run_number,
+            total_runs=repeat,
+            max_nodes=max_nodes,
         )
         run_duration = time.time() - run_start_time
 
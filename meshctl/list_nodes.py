@@ -1,95 +1,427 @@
 """List nodes functionality for meshcli."""
 
-import datetime
+from __future__ import annotations
+
+import glob
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
 
 import click
-from .connection import address_options, connect
+from .connection import (
+    address_options,
+    close,
+    in_shared_session,
+    open_interface_with_status,
+)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Shared stand-in for nodes without user info, never modified
+_NO_USER = {}
+
+
+class _Row(NamedTuple):
+    """A node as listed by list-nodes; rows sort by last heard, then number."""
+
+    last_heard: int
+    num: int
+    node_id: str
+    name: str
+    snr: float | None
+
+
+@lru_cache(maxsize=1024)
+def format_time(timestamp):
+    """Format a timestamp as local time, the way list-nodes shows it."""
+    return time.strftime(TIME_FORMAT, time.localtime(timestamp))
+
+
+def cache_dir():
+    """Directory node database snapshots are saved in."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "meshctl")
+
+
+# Serializes updates of the address index between list-nodes worker threads
+_index_lock = threading.Lock()
+
+
+def _write_json(path, data):
+    """Write data as JSON to path, replacing any old file atomically."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_json(path):
+    """Read a JSON file, or return None if it doesn't exist."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _snapshot_path(local_num):
+    return os.path.join(cache_dir(), f"nodes-{local_num:08x}.json")
+
+
+def _index_path():
+    return os.path.join(cache_dir(), "index.json")
+
+
+def save_snapshot(nodes_by_num, local_num, address=None, interface_type=None):
+    """Save the node fields list-nodes shows, for use with --cached.
+
+    Each radio gets its own snapshot file, which is replaced atomically. When
+    the radio was given by address, the address is indexed to its snapshot
+    so --cached --address finds it again.
+    """
+    nodes = {}
+    for node_num, node in nodes_by_num.items():
+        user = node.get("user") or _NO_USER
+        nodes[str(node_num)] = {
+            "user": {key: user[key] for key in ("id", "longName") if key in user},
+            "snr": node.get("snr"),
+            "lastHeard": node.get("lastHeard"),
+        }
+    snapshot = {
+        "saved_at": time.time(),
+        "local_num": local_num,
+        "address": address,
+        "interface_type": interface_type,
+        "nodes": nodes,
+    }
+
+    os.makedirs(cache_dir(), exist_ok=True)
+    path = _snapshot_path(local_num)
+    _write_json(path, snapshot)
+    if address:
+        with _index_lock:
+            index = _read_json(_index_path()) or {}
+            if index.get(address) != os.path.basename(path):
+                index[address] = os.path.basename(path)
+                _write_json(_index_path(), index)
+
+
+def _load_snapshot_file(path):
+    snapshot = _read_json(path)
+    if snapshot is not None:
+        snapshot["nodes"] = {int(num): node for num, node in snapshot["nodes"].items()}
+    return snapshot
+
+
+def load_snapshot(address):
+    """Load the snapshot saved for a device address or node id, or None."""
+    filename = (_read_json(_index_path()) or {}).get(address)
+    if filename is not None:
+        return _load_snapshot_file(os.path.join(cache_dir(), filename))
+    if re.fullmatch(r"![0-9a-fA-F]{8}", address):
+        return _load_snapshot_file(_snapshot_path(int(address[1:], 16)))
+    return None
+
+
+def list_snapshots():
+    """Load every saved snapshot, most recent first."""
+    snapshots = [
+        _load_snapshot_file(path)
+        for path in glob.glob(os.path.join(cache_dir(), "nodes-*.json"))
+    ]
+    return sorted(
+        (snapshot for snapshot in snapshots if snapshot is not None),
+        key=lambda snapshot: snapshot["saved_at"],
+        reverse=True,
+    )
+
+
+def describe_snapshot(snapshot):
+    """Name the radio a snapshot belongs to, and how it was reached."""
+    description = f"!{snapshot['local_num']:08x}"
+    if snapshot.get("address"):
+        description += f" via {snapshot['address']}"
+    return description
+
+
+def _collect_into(messages):
+    """Return an echo function that records (message, err) pairs."""
+
+    def echo(message="", err=False):
+        messages.append((message, err))
+
+    return echo
 
 
 class NodeLister:
-    def __init__(self, interface_type="serial", device_path=None):
+    def __init__(
+        self,
+        interface_type="serial",
+        device_path=None,
+        connect_timeout=None,
+        echo=None,
+    ):
         self.interface_type = interface_type
         self.device_path = device_path
+        self.connect_timeout = connect_timeout
+        # Status and error messages go here instead of click.echo when set
+        self.echo = echo
         self.interface = None
+        self.config_complete = False
+
+    def _echo(self, message, err=False):
+        (self.echo or click.echo)(message, err=err)
 
     def connect(self):
-        """Connect to the Meshtastic device using the unified connect function."""
-        self.interface = connect(
-            address=self.device_path, interface_type=self.interface_type
-        )
-        if self.interface is None:
-            click.echo("Failed to connect", err=True)
-            return False
-        try:
-            self.interface.waitForConfig()
-            click.echo("Connected to Meshtastic device")
+        """Connect to the Meshtastic device and wait for its configuration."""
+        if self.interface is not None:
             return True
-        except Exception as e:
-            click.echo(f"Failed to connect: {e}", err=True)
-            return False
+        self.interface, self.config_complete = open_interface_with_status(
+            address=self.device_path,
+            interface_type=self.interface_type,
+            connect_timeout=self.connect_timeout,
+            echo=self.echo,
+        )
+        return self.interface is not None
 
-    def show_known_nodes(self):
-        """Show currently known nodes from the node database"""
-        if not self.connect():
+    def close(self):
+        """Close the connection to the Meshtastic device, if any."""
+        close(self.interface)
+        self.interface = None
+
+    def show_known_nodes(self, cached=False, limit=None):
+        """Show currently known nodes from the node database.
+
+        With ``cached``, the snapshot saved by the last run is shown instead,
+        without connecting to the device. At most ``limit`` nodes are listed.
+        """
+        if cached:
+            self.show_cached_nodes(limit=limit)
             return
 
+        lines = self.known_nodes_report(limit)
+        if lines is not None:
+            click.echo("\n".join(lines))
+
+    def known_nodes_report(self, limit=None):
+        """Connect and return the known nodes report lines, or None on failure.
+
+        Only connection status and errors are printed, through ``echo`` when
+        set, so reports for several devices can be gathered concurrently.
+        """
+        if not self.connect():
+            return None
+
         try:
-            click.echo("📋 Currently known nodes in database:")
+            lines = ["📋 Currently known nodes in database:"]
 
             if self.interface.nodesByNum:
-                known_nodes = []
-                for node_num, node in self.interface.nodesByNum.items():
-                    if node_num == self.interface.localNode.nodeNum:
-                        continue  # Skip ourselves
-
-                    user = node.get("user", {})
-                    node_id = user.get("id", f"!{node_num:08x}")
-                    long_name = user.get("longName", "Unknown")
-                    snr = node.get("snr")
-                    last_heard = node.get("lastHeard")
-
-                    known_nodes.append(
-                        {
-                            "id": node_id,
-                            "name": long_name,
-                            "snr": snr,
-                            "last_heard": last_heard,
-                            "num": node_num,
-                        }
-                    )
-
-                if known_nodes:
-                    # Sort by last heard (most recent first)
-                    def sort_key(x):
-                        return x["last_heard"] or 0
-
-                    known_nodes.sort(key=sort_key, reverse=True)
-
-                    for i, node in enumerate(known_nodes, 1):
-                        last_heard_str = "Unknown"
-                        if node["last_heard"]:
-                            dt = datetime.datetime.fromtimestamp(node["last_heard"])
-                            last_heard_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-
-                        snr_str = (
-                            f"SNR: {node['snr']}dB" if node["snr"] else "SNR: Unknown"
-                        )
-                        click.echo(f"  {i}. {node['id']} ({node['name']})")
-                        click.echo(f"     {snr_str}, " f"Last heard: {last_heard_str}")
-                else:
-                    click.echo("  No other nodes in database")
+                local_num = self.interface.localNode.nodeNum
+                lines += self.format_nodes(self.interface.nodesByNum, local_num, limit)
+                self.update_snapshot(local_num)
             else:
-                click.echo("  Node database is empty")
+                lines.append("  Node database is empty")
+            return lines
 
         except Exception as e:
-            click.echo(f"Error showing known nodes: {e}", err=True)
+            self._echo(f"Error showing known nodes: {e}", err=True)
+            return None
         finally:
-            self.interface.close()
+            self.close()
+
+    def update_snapshot(self, local_num):
+        """Save the node database for --cached, unless it is only partial."""
+        if not self.config_complete:
+            # Keep the last complete snapshot rather than replacing it
+            self._echo(
+                "Not updating the cached node database, "
+                "the device configuration was incomplete",
+                err=True,
+            )
+            return
+        try:
+            save_snapshot(
+                self.interface.nodesByNum,
+                local_num,
+                address=self.device_path,
+                interface_type=self.interface_type,
+            )
+        except (OSError, TypeError, ValueError) as e:
+            self._echo(f"Could not save node database cache: {e}", err=True)
+
+    def show_cached_nodes(self, limit=None):
+        """Show the node database snapshot saved for this device.
+
+        Without a device address, the snapshot is only picked when a single
+        radio has one, otherwise the saved ones are listed.
+        """
+        try:
+            if self.device_path:
+                snapshot = load_snapshot(self.device_path)
+            else:
+                snapshots = list_snapshots()
+                if len(snapshots) > 1:
+                    lines = [
+                        (
+                            "Several radios have a cached node database, "
+                            "pick one with --address:"
+                        )
+                    ]
+                    lines += [
+                        (
+                            f"  {describe_snapshot(snapshot)}, cached at "
+                            f"{format_time(snapshot['saved_at'])}"
+                        )
+                        for snapshot in snapshots
+                    ]
+                    click.echo("\n".join(lines), err=True)
+                    return
+                snapshot = snapshots[0] if snapshots else None
+        except (OSError, ValueError, KeyError) as e:
+            click.echo(f"Error reading node database cache: {e}", err=True)
+            return
+        if snapshot is None:
+            device = f" for {self.device_path}" if self.device_path else ""
+            click.echo(
+                f"No cached node database{device}, "
+                "run list-nodes without --cached first",
+                err=True,
+            )
+            return
+
+        lines = [
+            (
+                f"📋 Known nodes in database of {describe_snapshot(snapshot)}, "
+                f"cached at {format_time(snapshot['saved_at'])}:"
+            )
+        ]
+        lines += self.format_nodes(snapshot["nodes"], snapshot["local_num"], limit)
+        click.echo("\n".join(lines))
+
+    def format_nodes(self, nodes_by_num, local_num, limit=None):
+        """Format the node list lines, most recently heard first, skipping ourselves.
+
+        Only the ``limit`` most recently heard nodes are listed when given.
+        """
+
+        def rows():
+            for node_num, node in nodes_by_num.items():
+                if node_num == local_num:
+                    continue
+                user = node.get("user") or _NO_USER
+                yield _Row(
+                    node.get("lastHeard") or 0,
+                    node_num,
+                    user.get("id") or f"!{node_num:08x}",
+                    user.get("longName", "Unknown"),
+                    node.get("snr"),
+                )
+
+        total = len(nodes_by_num) - (local_num in nodes_by_num)
+        if not total:
+            return ["  No other nodes in database"]
+
+        # Node numbers are unique, so rows never compare past them; with a
+        # limit only the top rows are ever kept in memory
+        if limit and limit < total:
+            top = heapq.nlargest(limit, rows())
+        else:
+            top = sorted(rows(), reverse=True)
+
+        lines = []
+        for i, row in enumerate(top, 1):
+            last_heard_str = "Unknown"
+            if row.last_heard:
+                last_heard_str = format_time(row.last_heard)
+
+            snr_str = "SNR: Unknown" if row.snr is None else f"SNR: {row.snr}dB"
+            lines.append(f"  {i}. {row.node_id} ({row.name})")
+            lines.append(f"     {snr_str}, Last heard: {last_heard_str}")
+        if len(top) < total:
+            lines.append(f"  ... and {total - len(top)} more, use --limit to show them")
+        return lines
 
 
 @click.command("list-nodes")
-@address_options
-def list_nodes(address, interface_type):
+@address_options(multiple=True)
+@click.option(
+    "--cached",
+    is_flag=True,
+    help="Show the node database saved by the last run, without connecting",
+)
+@click.option(
+    "--limit",
+    type=click.IntRange(min=0),
+    default=50,
+    show_default=True,
+    help="Show only this many most recently heard nodes (0 for all)",
+)
+@click.option(
+    "--connect-timeout",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Seconds to wait for the device configuration before listing what "
+    "is known so far",
+)
+def list_nodes(address, interface_type, cached, limit, connect_timeout):
     """Show currently known nodes from the node database."""
-    lister = NodeLister(interface_type=interface_type, device_path=address)
-    lister.show_known_nodes()
+    if len(address) <= 1:
+        lister = NodeLister(
+            interface_type=interface_type,
+            device_path=address[0] if address else None,
+            connect_timeout=connect_timeout,
+        )
+        lister.show_known_nodes(cached=cached, limit=limit)
+        return
+
+    if cached:
+        for device in address:
+            click.echo(f"\n🔌 {device}")
+            lister = NodeLister(interface_type=interface_type, device_path=device)
+            lister.show_cached_nodes(limit=limit)
+        return
+
+    if in_shared_session():
+        raise click.UsageError(
+            "The shell is connected to a single device, "
+            "--address can only be given once"
+        )
+
+    # Connecting mostly waits on the radios, so query all of them at once.
+    # Their messages are collected and printed from here, under each
+    # device, in the order the devices were given
+    messages = {device: [] for device in address}
+    listers = [
+        NodeLister(
+            interface_type=interface_type,
+            device_path=device,
+            connect_timeout=connect_timeout,
+            echo=_collect_into(messages[device]),
+        )
+        for device in address
+    ]
+    with ThreadPoolExecutor(max_workers=len(listers)) as executor:
+        futures = [
+            executor.submit(lister.known_nodes_report, limit) for lister in listers
+        ]
+        for device, future in zip(address, futures):
+            lines = future.result()
+            click.echo(f"\n🔌 {device}")
+            for message, err in messages[device]:
+                click.echo(message, err=err)
+            if lines is not None:
+                click.echo("\n".join(lines))
@@ -1,9 +1,9 @@
 """Ping functionality for meshctl."""
 
+import threading
 import time
 
 import click
-from pubsub import pub
 from rich.panel import Panel
 from rich.progress import (
     Progress,
@@ -12,9 +12,10 @@ from rich.progress import (
     BarColumn,
     TimeElapsedColumn,
 )
+from rich.text import Text
 
 from .connection import address_options
-from .traceroute import TracerouteBase
+from .traceroute import PROGRESS_INTERVAL, TracerouteBase
 
 
 class NodePinger(TracerouteBase):
@@ -29,14 +30,21 @@ class NodePinger(TracerouteBase):
         super().__init__(interface_type, device_path, debug, test_run_id, csv_file)
         self.ping_responses = []
         self.response_received = False
+        self._response_event = threading.Event()
 
     def on_traceroute_response(self, packet, interface):
         """Handle traceroute responses during ping"""
-        if not self.active:
+        if not self.active or self.is_duplicate_packet(packet):
             return
 
-        # Pretty print the packet details only in debug mode
-        if self.debug:
+        # Panels for this packet, printed together in a single console write
+        renderables = []
+
+        # Pretty print the packet details only in debug mode, and only on a
+        # terminal; redirected output gets a cheaper one-line summary
+        if self.debug and not self.console.is_terminal:
+            renderables.append(Text(self.format_packet_summary(packet), style="blue"))
+        elif self.debug:
             packet_details = self.format_packet_details(packet)
             content = "\n".join(packet_details)
 
@@ -46,81 +54,33 @@ class NodePinger(TracerouteBase):
                 border_style="blue",
                 padding=(0, 1),
             )
-            self.console.print(panel)
-
-        if packet.get("decoded", {}).get("portnum") == "TRACEROUTE_APP":
-            sender_id = packet.get("fromId", f"!{packet.get('from', 0):08x}")
-            snr = packet.get("rxSnr", "Unknown")
-            rssi = packet.get("rxRssi", "Unknown")
-            rnode = packet.get("relay_node")
-
-            # Check if this is a forwarded packet (SNR back entries > 1)
-            traceroute = packet.get("decoded", {}).get("traceroute", {})
-            snr_back = traceroute.get("snrBack", []) if traceroute else []
-            is_forwarded_packet = len(snr_back) > 1
-
-            # Extract snrTowards values from traceroute data
-            snr_towards = None
-            if traceroute and "snrTowards" in traceroute:
-                snr_towards_raw = traceroute["snrTowards"]
-                if snr_towards_raw and len(snr_towards_raw) > 1:
-                    # Convert raw values to dB by dividing by 4.0, skip first 0.0
-                    snr_towards = snr_towards_raw[-1] / 4.0
-
-            # Skip SNR consideration if this is a forwarded packet
-            if is_forwarded_packet:
-                snr = "Forwarded"
-                rssi = "Forwarded"
-
-            # Format display name with known node info
-            display_name = self.format_node_display(sender_id, self.known_nodes)
-
-            # Format relay node display
-            relay_display = ""
-            if rnode is not None:
-                relay_hex = f"______{rnode:02x}"
-                relay_display = f" via relay 0x{relay_hex}"
-
-                # Find candidate nodes
-                candidates = self.find_relay_candidates(rnode)
-                if candidates:
-                    candidate_names = [cand["name"] for cand in candidates]
-                    relay_display += f" (candidates: {', '.join(candidate_names)})"
-
-            # Create content for the panel
-            content = f"[bold cyan]Ping response from:[/bold cyan] {display_name}{relay_display}\n"
-
-            if snr != "Unknown":
-                if snr_towards is not None:
-                    content += f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm, SNR_towards={snr_towards}dB"
-                else:
-                    content += (
-                        f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm"
-                    )
+            renderables.append(panel)
 
-            # Create a beautiful panel for the ping output
-            panel = Panel(
-                content,
-                title="[bold green]🏓 Ping Response[/bold green]",
-                border_style="green",
-                padding=(0, 1),
-            )
-            self.console.print(panel)
-
-            self.ping_responses.append(
-                {
-                    "id": sender_id,
-                    "from_num": packet.get("from"),
-                    "snr": snr,
-                    "rssi": rssi,
-                    "snr_towards": snr_towards,
-                    "timestamp": time.time(),
-                    "packet": packet,
-                }
-            )
+        # meshtastic only publishes TRACEROUTE_APP packets on this topic
+        sender_id, snr, rssi, snr_towards, rnode = self.parse_response(
+            packet, packet["decoded"]
+        )
+        content = self.format_response_content(
+            "Ping response from", sender_id, snr, rssi, snr_towards, rnode
+        )
 
-            # Set flag to indicate we received a response
-            self.response_received = True
+        # Create a beautiful panel for the ping output
+        panel = Panel(
+            content,
+            title="[bold green]🏓 Ping Response[/bold green]",
+            border_style="green",
+            padding=(0, 1),
+        )
+        renderables.append(panel)
+        self.console.print(*renderables)
+
+        self.ping_responses.append(
+            self.make_node_record(sender_id, packet.get("from"), snr, rssi, snr_towards)
+        )
+
+        # Set flag to indicate we received a response and wake up ping_node
+        self.response_received = True
+        self._response_event.set()
 
     def ping_node(self, destination_id, duration=30, current_run=None, total_runs=None):
         """Send ping to specific node and listen for responses"""
@@ -130,13 +90,15 @@ class NodePinger(TracerouteBase):
         try:
             # Get known nodes first
             self.known_nodes = self.get_known_nodes()
+            self.index_relay_candidates()
 
             # Subscribe to traceroute responses
-            pub.subscribe(self.on_traceroute_response, "meshtastic.receive.traceroute")
+            self.subscribe_responses()
 
             self.active = True
             self.ping_responses = []
             self.response_received = False
+            self._response_event.clear()
 
             click.echo(f"🏓 Pinging node {destination_id}...")
             click.echo(f"   Listening for responses for {duration} seconds...")
@@ -168,13 +130,13 @@ class NodePinger(TracerouteBase):
 
                 task = progress.add_task(description, total=duration)
 
-                start_time = time.time()
-                while (
-                    time.time() - start_time < duration and not self.response_received
-                ):
-                    elapsed = time.time() - start_time
-                    progress.update(task, completed=elapsed)
-                    time.sleep(0.1)  # More frequent updates for smoother progress bar
+                start_time = time.monotonic()
+                deadline = start_time + duration
+                while (remaining := deadline - time.monotonic()) > 0:
+                    # Block until the response arrives or the progress bar is due
+                    if self._response_event.wait(min(remaining, PROGRESS_INTERVAL)):
+                        break
+                    progress.update(task, completed=time.monotonic() - start_time)
 
                 # Update progress to completion if we got a response early
                 if self.response_received:
@@ -188,14 +150,13 @@ class NodePinger(TracerouteBase):
                 # Create a table for the results
                 table = self.create_results_table(
                     self.ping_responses,
-                    self.known_nodes,
                     f"\n📊 Ping complete! Received {response_count} response(s) from {destination_id}:",
                 )
                 self.console.print(table)
 
                 # Append to CSV if requested
                 if self.csv_file:
-                    self.append_to_csv(self.ping_responses, self.known_nodes)
+                    self.append_to_csv(self.ping_responses)
             else:
                 click.echo(f"  No response received from {destination_id}")
 
@@ -209,11 +170,9 @@ class NodePinger(TracerouteBase):
             return []
         finally:
             self.active = False
-            pub.unsubscribe(
-                self.on_traceroute_response, "meshtastic.receive.traceroute"
-            )
-            if self.interface:
-                self.interface.close()
+            self.unsubscribe_responses()
+            self._response_event.clear()
+            self.close()
 
 
 @click.command()
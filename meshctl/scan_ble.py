@@ -1,7 +1,6 @@
 """BLE scan functionality for meshcli."""
 
 import click
-import meshtastic.ble_interface
 
 
 @click.command("scan-ble")
@@ -9,6 +8,8 @@ def scan_ble():
     """Scan for Meshtastic BLE devices."""
     click.echo("🔍 Scanning for BLE devices...")
     try:
+        import meshtastic.ble_interface
+
         devices = meshtastic.ble_interface.BLEInterface.scan()
         if not devices:
             click.echo("No BLE devices found.")
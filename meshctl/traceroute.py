@@ -2,13 +2,57 @@
 
 import csv
 import os
-import datetime
+from datetime import datetime
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
 
 import click
-from meshtastic.protobuf import portnums_pb2, mesh_pb2
 from rich.console import Console
 from rich.table import Table
-from .connection import connect
+from .connection import close, open_interface
+
+# pubsub topic meshtastic publishes decoded traceroute packets on
+TRACEROUTE_TOPIC = "meshtastic.receive.traceroute"
+
+# How often progress bars are advanced while waiting for responses
+PROGRESS_INTERVAL = 0.5
+
+# Number of recently seen packets remembered for duplicate suppression
+SEEN_PACKETS_MAX = 1024
+
+
+@lru_cache(maxsize=1024)
+def _format_node_display(node_id, short, long_name):
+    """Format [Short] LongName, falling back to the parts that are set or the ID.
+
+    The same few nodes show up in every packet, so results are cached; the
+    names are part of the key, so a renamed node is never shown stale.
+    """
+    if short and long_name:
+        return f"[{short}] {long_name}"
+    elif long_name:
+        return long_name
+    elif short:
+        return f"[{short}]"
+    return node_id
+
+
+class NodeRecord(NamedTuple):
+    """A traceroute response, with the fields shown in the results."""
+
+    id: str
+    from_num: int
+    snr: object
+    rssi: object
+    snr_towards: object
+    timestamp: float
+    short_name: str
+    long_name: str
+    snr_str: str
+    rssi_str: str
+    snr_towards_str: str
 
 
 class TracerouteBase:
@@ -25,6 +69,7 @@ class TracerouteBase:
         self.interface_type = interface_type
         self.device_path = device_path
         self.interface = None
+        self._local_num = None
         self.debug = debug
         self.responses = []
         self.active = False
@@ -32,92 +77,232 @@ class TracerouteBase:
         self.test_run_id = test_run_id
         self.csv_file = csv_file
         self.known_nodes = {}
+        self._seen_packets = OrderedDict()
+        self._subscribed = False
+        self._relay_index = {}
+        self._start_clock()
 
     def connect(self):
-        """Connect to the Meshtastic device using the unified connect function."""
-        self.interface = connect(
+        """Connect to the Meshtastic device and wait for its configuration."""
+        if self.interface is not None:
+            return True
+        self.interface = open_interface(
             address=self.device_path, interface_type=self.interface_type
         )
         if self.interface is None:
-            click.echo("Failed to connect", err=True)
             return False
-        try:
-            self.interface.waitForConfig()
-            click.echo("Connected to Meshtastic device")
-            return True
-        except Exception as e:
-            click.echo(f"Failed to connect: {e}", err=True)
+        self._local_num = self.interface.localNode.nodeNum
+        return True
+
+    def close(self):
+        """Close the connection to the Meshtastic device, if any."""
+        close(self.interface)
+        self.interface = None
+        self._local_num = None
+
+    def subscribe_responses(self):
+        """Deliver incoming traceroute packets to on_traceroute_response.
+
+        Subscribing again while already subscribed is a no-op.
+        """
+        if not self._subscribed:
+            from pubsub import pub
+
+            pub.subscribe(self.on_traceroute_response, TRACEROUTE_TOPIC)
+            self._subscribed = True
+
+    def unsubscribe_responses(self):
+        """Stop delivering traceroute packets, if subscribed."""
+        if self._subscribed:
+            from pubsub import pub
+
+            pub.unsubscribe(self.on_traceroute_response, TRACEROUTE_TOPIC)
+            self._subscribed = False
+
+    def is_duplicate_packet(self, packet):
+        """Return True if this packet was already seen, remembering it otherwise.
+
+        Retransmissions and copies heard through several relays share the
+        same sender and packet id, so only the first one is processed.
+        """
+        packet_id = packet.get("id")
+        if packet_id is None:
             return False
 
-    def get_known_nodes(self):
-        """Get known nodes from the node database"""
-        known_nodes = {}
-        if self.interface and self.interface.nodesByNum:
-            for node_num, node in self.interface.nodesByNum.items():
-                if node_num == self.interface.localNode.nodeNum:
-                    continue  # Skip ourselves
+        key = (packet.get("fromId"), packet_id)
+        if key in self._seen_packets:
+            self._seen_packets.move_to_end(key)
+            return True
 
-                user = node.get("user", {})
-                node_id = user.get("id", f"!{node_num:08x}")
-                long_name = user.get("longName", "")
-                short_name = user.get("shortName", "")
+        self._seen_packets[key] = None
+        if len(self._seen_packets) > SEEN_PACKETS_MAX:
+            self._seen_packets.popitem(last=False)
+        return False
 
-                known_nodes[node_id] = {
-                    "long_name": long_name,
-                    "short_name": short_name,
-                    "node_num": node_num,
-                }
-        return known_nodes
+    def get_known_nodes(self):
+        """Get known nodes from the node database"""
+        if not self.interface or not self.interface.nodesByNum:
+            return {}
+
+        local_num = self._local_num
+        return {
+            (user := node.get("user", {})).get("id", f"!{node_num:08x}"): {
+                "long_name": user.get("longName", ""),
+                "short_name": user.get("shortName", ""),
+                "node_num": node_num,
+            }
+            for node_num, node in self.interface.nodesByNum.items()
+            if node_num != local_num  # Skip ourselves
+        }
 
     def format_node_display(self, node_id, known_nodes):
         """Format node display with [Short] LongName if known, otherwise just ID"""
-        if node_id in known_nodes:
-            node_info = known_nodes[node_id]
-            short = node_info["short_name"]
-            long_name = node_info["long_name"]
-
-            if short and long_name:
-                return f"[{short}] {long_name}"
-            elif long_name:
-                return long_name
-            elif short:
-                return f"[{short}]"
+        node_info = known_nodes.get(node_id)
+        if node_info is None:
+            return node_id
+        return _format_node_display(
+            node_id, node_info["short_name"], node_info["long_name"]
+        )
 
-        return node_id
+    def index_relay_candidates(self):
+        """Index known 0-hop nodes by the last byte of their node number.
 
-    def find_relay_candidates(self, relay_node_last_byte):
-        """Find known nodes at 0 hops that could match the relay node based on last hex digits"""
-        candidates = []
+        Packets only carry the last byte of the relay node, so this lets
+        find_relay_candidates() resolve it with a dict lookup. Call it after
+        known_nodes is populated, since the candidate names come from it.
+        """
+        index = {}
 
         # Only consider nodes that are at 0 hops (directly reachable)
         if self.interface and self.interface.nodesByNum:
+            local_num = self._local_num
             for node_num, node in self.interface.nodesByNum.items():
                 # Skip ourselves
-                if node_num == self.interface.localNode.nodeNum:
+                if node_num == local_num:
                     continue
 
-                # Only consider nodes at 0 hops
                 if node.get("hopsAway", float("inf")) == 0:
-                    # Check if the last byte matches
-                    if (node_num & 0xFF) == relay_node_last_byte:
-                        user = node.get("user", {})
-                        node_id = user.get("id", f"!{node_num:08x}")
-
-                        candidates.append(
-                            {
-                                "id": node_id,
-                                "node_num": node_num,
-                                "name": self.format_node_display(
-                                    node_id, self.known_nodes
-                                ),
-                            }
-                        )
-
-        return candidates
+                    user = node.get("user", {})
+                    node_id = user.get("id", f"!{node_num:08x}")
+
+                    index.setdefault(node_num & 0xFF, []).append(
+                        {
+                            "id": node_id,
+                            "node_num": node_num,
+                            "name": self.format_node_display(node_id, self.known_nodes),
+                        }
+                    )
+
+        self._relay_index = index
+
+    def find_relay_candidates(self, relay_node_last_byte):
+        """Find known nodes at 0 hops that could match the relay node based on last hex digits"""
+        return self._relay_index.get(relay_node_last_byte, ())
+
+    def _start_clock(self):
+        """Anchor response timestamps to the current wall-clock time."""
+        self._wall_start = time.time()
+        self._monotonic_start = time.monotonic()
+
+    def make_node_record(self, sender_id, from_num, snr, rssi, snr_towards):
+        """Build the result record for a response, with its display fields.
+
+        Names and string values are resolved here, when the response
+        arrives, so the results table and CSV writer can use them as is.
+        """
+        node_info = self.known_nodes.get(sender_id, {})
+        return NodeRecord(
+            id=sender_id,
+            from_num=from_num,
+            snr=snr,
+            rssi=rssi,
+            snr_towards=snr_towards,
+            # Wall time at the anchor plus monotonic time since, so results
+            # stay in order even if the system clock jumps
+            timestamp=self._wall_start + (time.monotonic() - self._monotonic_start),
+            short_name=node_info.get("short_name", ""),
+            long_name=node_info.get("long_name", ""),
+            snr_str=str(snr),
+            rssi_str=str(rssi),
+            snr_towards_str="" if snr_towards is None else str(snr_towards),
+        )
+
+    def parse_response(self, packet, decoded):
+        """Extract the sender and signal info from a traceroute response.
+
+        Returns (sender_id, snr, rssi, snr_towards, relay_node). SNR and RSSI
+        are reported as "Forwarded" when the response came through other
+        nodes, since they then describe the last hop only.
+        """
+        sender_id = packet.get("fromId", f"!{packet.get('from', 0):08x}")
+        snr = packet.get("rxSnr", "Unknown")
+        rssi = packet.get("rxRssi", "Unknown")
+        rnode = packet.get("relay_node")
+
+        # Check if this is a forwarded packet (SNR back entries > 1)
+        traceroute = decoded.get("traceroute")
+        snr_back = traceroute.get("snrBack", []) if traceroute else []
+        is_forwarded_packet = len(snr_back) > 1
+
+        # Extract snrTowards values from traceroute data
+        snr_towards = None
+        if traceroute and "snrTowards" in traceroute:
+            snr_towards_raw = traceroute["snrTowards"]
+            if snr_towards_raw and len(snr_towards_raw) > 1:
+                # Convert raw values to dB by dividing by 4.0, skip first 0.0
+                snr_towards = snr_towards_raw[-1] / 4.0
+
+        # Skip SNR consideration if this is a forwarded packet
+        if is_forwarded_packet:
+            snr = "Forwarded"
+            rssi = "Forwarded"
+
+        return sender_id, snr, rssi, snr_towards, rnode
+
+    def format_response_content(self, label, sender_id, snr, rssi, snr_towards, rnode):
+        """Format the panel body shown for a traceroute response"""
+        # Format display name with known node info
+        display_name = self.format_node_display(sender_id, self.known_nodes)
+
+        # Format relay node display
+        relay_display = ""
+        if rnode is not None:
+            relay_display = f" via relay 0x______{rnode:02x}"
+
+            # Find candidate nodes
+            candidates = self.find_relay_candidates(rnode)
+            if candidates:
+                candidate_names = ", ".join(cand["name"] for cand in candidates)
+                relay_display += f" (candidates: {candidate_names})"
+
+        content = f"[bold cyan]{label}:[/bold cyan] {display_name}{relay_display}\n"
+
+        if snr != "Unknown":
+            if snr_towards is not None:
+                content += f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm, SNR_towards={snr_towards}dB"
+            else:
+                content += (
+                    f"[bold green]Signal:[/bold green] SNR={snr}dB, RSSI={rssi}dBm"
+                )
+
+        return content
+
+    def format_packet_summary(self, packet):
+        """Format a one-line summary of a packet for debug output"""
+        decoded = packet.get("decoded") or {}
+        return (
+            f"📦 Packet {packet.get('id', 'Unknown')}"
+            f" from {packet.get('fromId', 'Unknown')}"
+            f" port={decoded.get('portnum', 'Unknown')}"
+            f" SNR={packet.get('rxSnr', 'Unknown')}dB"
+            f" RSSI={packet.get('rxRssi', 'Unknown')}dBm"
+            f" hops={packet.get('hopStart', '?')}/{packet.get('hopLimit', '?')}"
+        )
 
     def format_packet_details(self, packet):
         """Format packet details in a nice, readable way"""
         details = []
+        known_nodes = self.known_nodes
 
         # Basic packet info
         details.append(
@@ -128,8 +313,8 @@ class TracerouteBase:
         from_id = packet.get("fromId", "Unknown")
         from_num = packet.get("from", "Unknown")
         from_display = f"{from_id}"
-        if from_id != "Unknown" and from_id in self.known_nodes:
-            from_name = self.format_node_display(from_id, self.known_nodes)
+        if from_id != "Unknown" and from_id in known_nodes:
+            from_name = self.format_node_display(from_id, known_nodes)
             from_display = f"{from_id} ({from_name})"
         elif from_num != "Unknown":
             from_display = f"{from_id} (num: {from_num})"
@@ -139,8 +324,8 @@ class TracerouteBase:
         to_id = packet.get("toId", "Unknown")
         to_num = packet.get("to", "Unknown")
         to_display = f"{to_id}"
-        if to_id != "Unknown" and to_id in self.known_nodes:
-            to_name = self.format_node_display(to_id, self.known_nodes)
+        if to_id != "Unknown" and to_id in known_nodes:
+            to_name = self.format_node_display(to_id, known_nodes)
             to_display = f"{to_id} ({to_name})"
         elif to_num != "Unknown":
             to_display = f"{to_id} (num: {to_num})"
@@ -160,24 +345,20 @@ class TracerouteBase:
 
         relay_display = relay_node
         if relay_node != "Unknown" and isinstance(relay_node, int):
-            relay_hex = f"______{relay_node:02x}"
-            relay_display = f"0x{relay_hex}"
+            relay_display = f"0x______{relay_node:02x}"
 
             # Find candidate nodes based on last hex digits
             candidates = self.find_relay_candidates(relay_node)
             if candidates:
-                candidate_names = [
-                    self.format_node_display(cand["id"], self.known_nodes)
-                    for cand in candidates
-                ]
-                relay_display += f" - Candidates: {', '.join(candidate_names)}"
+                candidate_names = ", ".join(cand["name"] for cand in candidates)
+                relay_display += f" - Candidates: {candidate_names}"
 
         details.append(
             f"[bold yellow]Hops:[/bold yellow] Limit={hop_limit}, Start={hop_start}, Relay={relay_display}"
         )
 
         # Decoded info
-        decoded = packet.get("decoded", {})
+        decoded = packet.get("decoded")
         if decoded:
             portnum = decoded.get("portnum", "Unknown")
             request_id = decoded.get("requestId", "Unknown")
@@ -187,7 +368,7 @@ class TracerouteBase:
             )
 
             # Traceroute specific info
-            traceroute = decoded.get("traceroute", {})
+            traceroute = decoded.get("traceroute")
             if traceroute:
                 details.append("[bold blue]Traceroute Data:[/bold blue]")
 
@@ -197,10 +378,8 @@ class TracerouteBase:
                     route_parts = []
                     for node in route:
                         node_id = f"!{node:08x}"
-                        if node_id in self.known_nodes:
-                            node_name = self.format_node_display(
-                                node_id, self.known_nodes
-                            )
+                        if node_id in known_nodes:
+                            node_name = self.format_node_display(node_id, known_nodes)
                             route_parts.append(f"{node_id} ({node_name})")
                         else:
                             route_parts.append(node_id)
@@ -209,7 +388,6 @@ class TracerouteBase:
 
                 # SNR towards information
                 snr_towards = traceroute.get("snrTowards", [])
-                route = traceroute.get("route", [])
                 if snr_towards:
                     snr_towards_parts = []
                     for i, snr in enumerate(snr_towards):
@@ -217,9 +395,9 @@ class TracerouteBase:
                         # Try to match with route nodes if available
                         if i < len(route):
                             node_id = f"!{route[i]:08x}"
-                            if node_id in self.known_nodes:
+                            if node_id in known_nodes:
                                 node_name = self.format_node_display(
-                                    node_id, self.known_nodes
+                                    node_id, known_nodes
                                 )
                                 snr_towards_parts.append(f"{snr_db} ({node_name})")
                             else:
@@ -241,9 +419,9 @@ class TracerouteBase:
                             route_idx = len(route) - 1 - i
                             if route_idx >= 0:
                                 node_id = f"!{route[route_idx]:08x}"
-                                if node_id in self.known_nodes:
+                                if node_id in known_nodes:
                                     node_name = self.format_node_display(
-                                        node_id, self.known_nodes
+                                        node_id, known_nodes
                                     )
                                     snr_back_parts.append(f"{snr_db} ({node_name})")
                                 else:
@@ -260,7 +438,7 @@ class TracerouteBase:
         rx_time = packet.get("rxTime", "Unknown")
         if rx_time != "Unknown":
             try:
-                dt = datetime.datetime.fromtimestamp(rx_time)
+                dt = datetime.fromtimestamp(rx_time)
                 details.append(
                     f"[bold white]Received:[/bold white] {dt.strftime('%Y-%m-%d %H:%M:%S')}"
                 )
@@ -269,7 +447,7 @@ class TracerouteBase:
 
         return details
 
-    def append_to_csv(self, nodes, known_nodes):
+    def append_to_csv(self, nodes):
         """Append results to CSV file"""
         # Check if file exists to determine if we need headers
         file_exists = os.path.exists(self.csv_file)
@@ -306,51 +484,33 @@ class TracerouteBase:
                     writer.writeheader()
 
                 # Write data rows
-                for i, node in enumerate(nodes, 1):
-                    node_id = node["id"]
-
-                    # Get node info from known nodes
-                    short_name = ""
-                    long_name = ""
-                    if node_id in known_nodes:
-                        node_info = known_nodes[node_id]
-                        short_name = node_info["short_name"]
-                        long_name = node_info["long_name"]
-
-                    snr = str(node["snr"]) if node["snr"] != "Unknown" else "Unknown"
-                    rssi = str(node["rssi"]) if node["rssi"] != "Unknown" else "Unknown"
-                    snr_towards = (
-                        str(node.get("snr_towards", ""))
-                        if node.get("snr_towards") is not None
-                        else ""
-                    )
-
+                for node in nodes:
                     # Format timestamp
-                    timestamp = datetime.datetime.fromtimestamp(
-                        node["timestamp"]
-                    ).strftime("%Y-%m-%d %H:%M:%S")
+                    timestamp = datetime.fromtimestamp(node.timestamp).strftime(
+                        "%Y-%m-%d %H:%M:%S"
+                    )
 
                     # Create row data
                     if self.test_run_id:
                         row = {
                             "Timestamp": timestamp,
                             "Test Run ID": self.test_run_id,
-                            "Node ID": node_id,
-                            "Short Name": short_name,
-                            "Long Name": long_name,
-                            "SNR (dB)": snr,
-                            "RSSI (dBm)": rssi,
-                            "SNR Towards (dB)": snr_towards,
+                            "Node ID": node.id,
+                            "Short Name": node.short_name,
+                            "Long Name": node.long_name,
+                            "SNR (dB)": node.snr_str,
+                            "RSSI (dBm)": node.rssi_str,
+                            "SNR Towards (dB)": node.snr_towards_str,
                         }
                     else:
                         row = {
                             "Timestamp": timestamp,
-                            "Node ID": node_id,
-                            "Short Name": short_name,
-                            "Long Name": long_name,
-                            "SNR (dB)": snr,
-                            "RSSI (dBm)": rssi,
-                            "SNR Towards (dB)": snr_towards,
+                            "Node ID": node.id,
+                            "Short Name": node.short_name,
+                            "Long Name": node.long_name,
+                            "SNR (dB)": node.snr_str,
+                            "RSSI (dBm)": node.rssi_str,
+                            "SNR Towards (dB)": node.snr_towards_str,
                         }
 
                     writer.writerow(row)
@@ -362,7 +522,10 @@ class TracerouteBase:
 
     def send_traceroute(self, destination_id, hop_limit=0):
         """Send a traceroute packet to the specified destination."""
+        from meshtastic.protobuf import mesh_pb2, portnums_pb2
+
         route_discovery = mesh_pb2.RouteDiscovery()
+        self._start_clock()
         packet = self.interface.sendData(
             data=route_discovery,
             destinationId=destination_id,
@@ -372,8 +535,8 @@ class TracerouteBase:
         )
         return packet
 
-    def create_results_table(self, nodes, known_nodes, title):
-        """Create a Rich table with the results."""
+    def new_results_table(self, title=None):
+        """Create an empty Rich table for the results."""
         table = Table(title=title)
         table.add_column("Timestamp", style="white", no_wrap=True)
         if self.test_run_id:
@@ -384,51 +547,38 @@ class TracerouteBase:
         table.add_column("SNR (dB)", style="green")
         table.add_column("RSSI (dBm)", style="yellow")
         table.add_column("SNR Towards (dB)", style="bright_blue")
+        return table
 
-        for node in nodes:
-            node_id = node["id"]
-
-            # Get node info from known nodes
-            short_name = ""
-            long_name = ""
-            if node_id in known_nodes:
-                node_info = known_nodes[node_id]
-                short_name = node_info["short_name"]
-                long_name = node_info["long_name"]
-
-            snr = str(node["snr"]) if node["snr"] != "Unknown" else "Unknown"
-            rssi = str(node["rssi"]) if node["rssi"] != "Unknown" else "Unknown"
-            snr_towards = (
-                str(node.get("snr_towards", ""))
-                if node.get("snr_towards") is not None
-                else ""
-            )
+    def add_results_row(self, table, node):
+        """Add a result record to a table from new_results_table()."""
+        # Format timestamp
+        timestamp = datetime.fromtimestamp(node.timestamp).strftime("%H:%M:%S")
 
-            # Format timestamp
-            timestamp = datetime.datetime.fromtimestamp(node["timestamp"]).strftime(
-                "%H:%M:%S"
+        if self.test_run_id:
+            table.add_row(
+                timestamp,
+                self.test_run_id,
+                node.id,
+                node.short_name,
+                node.long_name,
+                node.snr_str,
+                node.rssi_str,
+                node.snr_towards_str,
+            )
+        else:
+            table.add_row(
+                timestamp,
+                node.id,
+                node.short_name,
+                node.long_name,
+                node.snr_str,
+                node.rssi_str,
+                node.snr_towards_str,
             )
 
-            if self.test_run_id:
-                table.add_row(
-                    timestamp,
-                    self.test_run_id,
-                    node_id,
-                    short_name,
-                    long_name,
-                    snr,
-                    rssi,
-                    snr_towards,
-                )
-            else:
-                table.add_row(
-                    timestamp,
-                    node_id,
-                    short_name,
-                    long_name,
-                    snr,
-                    rssi,
-                    snr_towards,
-                )
-
+    def create_results_table(self, nodes, title):
+        """Create a Rich table with the results."""
+        table = self.new_results_table(title)
+        for node in nodes:
+            self.add_results_row(table, node)
         return table
@@ -0,0 +1,17 @@
+"""Shared test fixtures."""
+
+import pytest
+from click.testing import CliRunner
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keep node database snapshots out of the user's cache directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture(scope="session")
+def runner():
+    """A Click test runner shared by the command tests."""
+    return CliRunner()
@@ -2,44 +2,38 @@
 
 from unittest.mock import Mock, patch
 
-from click.testing import CliRunner
-
 from meshctl.cli import main
 
 
-def test_main_help():
+def test_main_help(runner):
     """Test that the main command shows help."""
-    runner = CliRunner()
     result = runner.invoke(main, ["--help"])
     assert result.exit_code == 0
     assert "A CLI tool for mesh operations" in result.output
 
 
-def test_discover_command_help():
+def test_discover_command_help(runner):
     """Test that the discover command shows help."""
-    runner = CliRunner()
     result = runner.invoke(main, ["discover", "--help"])
     assert result.exit_code == 0
     assert "Discover nearby Meshtastic nodes" in result.output
 
 
-def test_list_nodes_command_help():
+def test_list_nodes_command_help(runner):
     """Test that the list-nodes command shows help."""
-    runner = CliRunner()
     result = runner.invoke(main, ["list-nodes", "--help"])
     assert result.exit_code == 0
     assert "Show currently known nodes" in result.output
 
 
 @patch("meshctl.discover.NearbyNodeDiscoverer")
-def test_discover_command_connection_failure(mock_discoverer_class):
+def test_discover_command_connection_failure(mock_discoverer_class, runner):
     """Test discover command handles connection failure gracefully."""
     mock_discoverer = Mock()
     mock_discoverer.connect.return_value = False
     mock_discoverer.discover_nearby_nodes.return_value = []
     mock_discoverer_class.return_value = mock_discoverer
 
-    runner = CliRunner()
     result = runner.invoke(main, ["discover", "--duration", "1"])
 
     assert result.exit_code == 0
@@ -49,12 +43,11 @@ def test_discover_command_connection_failure(mock_discoverer_class):
     assert "No nearby nodes found" in result.output
 
 
-@patch("meshctl.list_nodes.connect")
-def test_list_nodes_command_connection_failure(mock_connect):
+@patch("meshctl.connection.connect")
+def test_list_nodes_command_connection_failure(mock_connect, runner):
     """Test list-nodes command handles connection failure gracefully."""
     mock_connect.return_value = None
 
-    runner = CliRunner()
     result = runner.invoke(main, ["list-nodes"])
 
     assert result.exit_code == 0
@@ -62,14 +55,13 @@ def test_list_nodes_command_connection_failure(mock_connect):
 
 
 @patch("meshctl.discover.NearbyNodeDiscoverer")
-def test_discover_command_with_tcp_interface(mock_discoverer_class):
+def test_discover_command_with_tcp_interface(mock_discoverer_class, runner):
     """Test discover command with TCP interface option."""
     mock_discoverer = Mock()
     mock_discoverer.connect.return_value = False
     mock_discoverer.discover_nearby_nodes.return_value = []
     mock_discoverer_class.return_value = mock_discoverer
 
-    runner = CliRunner()
     result = runner.invoke(
         main,
         [
@@ -92,17 +84,17 @@ def test_discover_command_with_tcp_interface(mock_discoverer_class):
         debug=False,
         test_run_id=None,
         csv_file=None,
+        verbose_packets=False,
     )
     mock_discoverer.discover_nearby_nodes.assert_called_once()
     assert "No nearby nodes found" in result.output
 
 
-@patch("meshctl.list_nodes.connect")
-def test_list_nodes_command_with_tcp_interface(mock_connect):
+@patch("meshctl.connection.connect")
+def test_list_nodes_command_with_tcp_interface(mock_connect, runner):
     """Test list-nodes command with TCP interface option."""
     mock_connect.return_value = None
 
-    runner = CliRunner()
     result = runner.invoke(
         main, ["list-nodes", "--interface-type", "tcp", "--address", "test.local"]
     )
@@ -112,23 +104,21 @@ def test_list_nodes_command_with_tcp_interface(mock_connect):
     assert "Failed to connect" in result.output
 
 
-def test_scan_ble_command_help():
+def test_scan_ble_command_help(runner):
     """Test that the scan-ble command shows help."""
-    runner = CliRunner()
     result = runner.invoke(main, ["scan-ble", "--help"])
     assert result.exit_code == 0
     assert "Scan for Meshtastic BLE devices" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_command_success(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_command_success(mock_scan, runner):
     """Test scan-ble command with successful scan."""
     mock_device = Mock()
     mock_device.name = "Test Device"
     mock_device.address = "AA:BB:CC:DD:EE:FF"
     mock_scan.return_value = [mock_device]
 
-    runner = CliRunner()
     result = runner.invoke(main, ["scan-ble"])
 
     assert result.exit_code == 0
@@ -137,25 +127,43 @@ def test_scan_ble_command_success(mock_scan):
     assert "AA:BB:CC:DD:EE:FF" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_command_no_devices(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_command_no_devices(mock_scan, runner):
     """Test scan-ble command with no devices found."""
     mock_scan.return_value = []
 
-    runner = CliRunner()
     result = runner.invoke(main, ["scan-ble"])
 
     assert result.exit_code == 0
     assert "No BLE devices found" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_command_error(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_command_error(mock_scan, runner):
     """Test scan-ble command with scan error."""
     mock_scan.side_effect = Exception("Scan failed")
 
-    runner = CliRunner()
     result = runner.invoke(main, ["scan-ble"])
 
     assert result.exit_code == 0
     assert "Error during BLE scan" in result.output
+
+
+@patch("meshctl.connection._tcp_interface_class")
+def test_shell_reuses_connection(mock_tcp_interface_class, runner):
+    """Test that commands run from the shell share one connection."""
+    mock_interface = Mock()
+    mock_interface.nodesByNum = {}
+    mock_tcp_interface = mock_tcp_interface_class.return_value
+    mock_tcp_interface.return_value = mock_interface
+
+    result = runner.invoke(
+        main,
+        ["shell", "--address", "192.0.2.1"],
+        input="list-nodes\nlist-nodes\nexit\n",
+    )
+
+    assert result.exit_code == 0
+    mock_tcp_interface.assert_called_once_with(hostname="192.0.2.1")
+    assert result.output.count("Node database is empty") == 2
+    mock_interface.close.assert_called_once()
@@ -0,0 +1,103 @@
+"""Tests for the connection module."""
+
+import socket
+from unittest.mock import Mock, call, patch
+
+import pytest
+
+from meshctl.connection import _tcp_peers, connect, detect_interface_type
+
+
+def test_detect_interface_type_serial():
+    """Test that device paths are detected as serial."""
+    assert detect_interface_type("/dev/ttyUSB0") == "serial"
+    assert detect_interface_type("/dev/cu.usbserial-0001") == "serial"
+
+
+def test_detect_interface_type_tcp():
+    """Test that IP addresses and hostnames are detected as TCP."""
+    assert detect_interface_type("192.168.1.10") == "tcp"
+    assert detect_interface_type("::1") == "tcp"
+    assert detect_interface_type("fe80::1:2") == "tcp"
+    assert detect_interface_type("2001:db8:0:0:0:0:0:1") == "tcp"
+    assert detect_interface_type("fe80::1%eth0") == "tcp"
+    assert detect_interface_type("[::1]") == "tcp"
+    assert detect_interface_type("[2001:db8::1]") == "tcp"
+    assert detect_interface_type("localhost") == "tcp"
+    assert detect_interface_type("meshtastic.local") == "tcp"
+
+
+def test_detect_interface_type_ble():
+    """Test that MAC addresses and device names are detected as BLE."""
+    assert detect_interface_type(None) == "ble"
+    assert detect_interface_type("any") == "ble"
+    assert detect_interface_type("AA:BB:CC:DD:EE:FF") == "ble"
+    assert detect_interface_type("Meshtastic_1234") == "ble"
+    assert detect_interface_type("12345678-1234-1234-1234-123456789abc") == "ble"
+
+
+def _socket(peer):
+    """Return a mock socket connected to peer."""
+    sock = Mock()
+    sock.getpeername.return_value = (peer, 4403)
+    return sock
+
+
+def _open_tcp(hostname):
+    """Open the socket of a TCP interface to hostname, without the handshake."""
+    interface = connect(hostname, "tcp", connectNow=False)
+    interface.myConnect()
+    return interface
+
+
+@patch("meshtastic.tcp_interface.socket.create_connection")
+def test_connect_tcp_reuses_connected_address(mock_create_connection):
+    """Test that reconnecting to a hostname skips the DNS lookup."""
+    _tcp_peers.clear()
+    mock_create_connection.side_effect = [_socket("192.0.2.7"), _socket("192.0.2.7")]
+
+    _open_tcp("radio.example")
+    _open_tcp("radio.example")
+
+    assert mock_create_connection.call_args_list == [
+        call(("radio.example", 4403)),
+        call(("192.0.2.7", 4403)),
+    ]
+
+
+@patch("meshtastic.tcp_interface.socket.create_connection")
+def test_connect_tcp_falls_back_to_name(mock_create_connection):
+    """Test that a hostname is resolved again once its address stops answering.
+
+    The name is handed to create_connection rather than a single address, so
+    every address it resolves to is tried, e.g. both the old and new lease.
+    """
+    _tcp_peers.clear()
+    _tcp_peers["radio.example"] = "192.0.2.7"
+    mock_create_connection.side_effect = [
+        ConnectionRefusedError("Connection refused"),
+        _socket("2001:db8::8"),
+    ]
+
+    interface = _open_tcp("radio.example")
+
+    assert mock_create_connection.call_args_list == [
+        call(("192.0.2.7", 4403)),
+        call(("radio.example", 4403)),
+    ]
+    assert interface.hostname == "radio.example"
+    assert _tcp_peers["radio.example"] == "2001:db8::8"
+
+
+@patch("meshtastic.tcp_interface.socket.create_connection")
+def test_connect_tcp_failure_is_not_cached(mock_create_connection):
+    """Test that a failed lookup is retried on the next connect."""
+    _tcp_peers.clear()
+    mock_create_connection.side_effect = socket.gaierror("Name or service not known")
+
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            _open_tcp("radio.example")
+
+    assert mock_create_connection.call_count == 2
+    assert "radio.example" not in _tcp_peers
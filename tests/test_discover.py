@@ -1,9 +1,9 @@
 """Tests for the discover module."""
 
+import signal
+import time
 from unittest.mock import Mock, patch
 
-from click.testing import CliRunner
-
 from meshctl.discover import NearbyNodeDiscoverer, discover
 
 
@@ -49,6 +49,18 @@ class TestNearbyNodeDiscoverer:
         assert result is False
         assert discoverer.interface is None
 
+    @patch("meshctl.connection.connect")
+    def test_connect_caches_local_node_num(self, mock_connect):
+        """Test that the local node number is looked up once on connect."""
+        mock_connect.return_value.localNode.nodeNum = 0x11111111
+
+        discoverer = NearbyNodeDiscoverer()
+        assert discoverer.connect() is True
+        assert discoverer._local_num == 0x11111111
+
+        discoverer.close()
+        assert discoverer._local_num is None
+
     @patch("meshctl.traceroute.TracerouteBase.connect")
     def test_connect_with_params(self, mock_connect):
         """Test connection with specific parameters."""
@@ -77,10 +89,340 @@ class TestNearbyNodeDiscoverer:
         with patch("meshctl.discover.click.echo"):
             discoverer.on_traceroute_response(packet, None)
 
+    def test_get_known_nodes(self):
+        """Test known nodes are read from the node database, skipping ourselves."""
+        discoverer = NearbyNodeDiscoverer()
+        assert discoverer.get_known_nodes() == {}
+
+        discoverer.interface = Mock()
+        discoverer._local_num = 0x11111111
+        discoverer.interface.nodesByNum = {
+            0x11111111: {"user": {"id": "!11111111", "longName": "Local"}},
+            0x22222222: {
+                "user": {"id": "!22222222", "longName": "Alpha", "shortName": "AB"}
+            },
+            0x33333333: {},
+        }
+
+        assert discoverer.get_known_nodes() == {
+            "!22222222": {
+                "long_name": "Alpha",
+                "short_name": "AB",
+                "node_num": 0x22222222,
+            },
+            "!33333333": {"long_name": "", "short_name": "", "node_num": 0x33333333},
+        }
+
+    def test_format_node_display(self):
+        """Test node display formatting from the known nodes map."""
+        discoverer = NearbyNodeDiscoverer()
+        known_nodes = {
+            "!00000001": {"short_name": "AB", "long_name": "Alpha", "node_num": 1},
+            "!00000002": {"short_name": "", "long_name": "Bravo", "node_num": 2},
+            "!00000003": {"short_name": "CD", "long_name": "", "node_num": 3},
+        }
+
+        assert discoverer.format_node_display("!00000001", known_nodes) == (
+            "[AB] Alpha"
+        )
+        assert discoverer.format_node_display("!00000002", known_nodes) == "Bravo"
+        assert discoverer.format_node_display("!00000003", known_nodes) == "[CD]"
+        assert discoverer.format_node_display("!00000004", known_nodes) == "!00000004"
+
+        known_nodes["!00000001"]["long_name"] = "Renamed"
+        assert discoverer.format_node_display("!00000001", known_nodes) == (
+            "[AB] Renamed"
+        )
+
+    def test_find_relay_candidates(self):
+        """Test relay candidates are the 0-hop nodes matching the last byte."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer.interface = Mock()
+        discoverer._local_num = 0x111111AA
+        discoverer.interface.nodesByNum = {
+            0x111111AA: {"hopsAway": 0},
+            0x222222AA: {"user": {"id": "!222222aa"}, "hopsAway": 0},
+            0x333333AA: {"user": {"id": "!333333aa"}, "hopsAway": 2},
+            0x444444BB: {"user": {"id": "!444444bb"}, "hopsAway": 0},
+        }
+        discoverer.known_nodes = {
+            "!222222aa": {"short_name": "AA", "long_name": "Alpha", "node_num": 1},
+        }
+
+        discoverer.index_relay_candidates()
+
+        assert discoverer.find_relay_candidates(0xAA) == [
+            {"id": "!222222aa", "node_num": 0x222222AA, "name": "[AA] Alpha"}
+        ]
+        assert [c["id"] for c in discoverer.find_relay_candidates(0xBB)] == [
+            "!444444bb"
+        ]
+        assert not discoverer.find_relay_candidates(0xCC)
+
+    def test_format_packet_details_relay_candidates(self):
+        """Test the relay line lists the indexed candidate names."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer._relay_index = {
+            0xAA: [{"id": "!222222aa", "node_num": 0x222222AA, "name": "[AA] Alpha"}]
+        }
+
+        details = discoverer.format_packet_details({"relayNode": 0xAA})
+
+        assert any(
+            "Relay=0x______aa - Candidates: [AA] Alpha" in line for line in details
+        )
+
+    def test_parse_response(self):
+        """Test signal extraction from direct and forwarded responses."""
+        discoverer = NearbyNodeDiscoverer()
+        packet = {
+            "fromId": "!12345678",
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+            "relay_node": 0x78,
+        }
+
+        decoded = {"traceroute": {"snrTowards": [0, 10], "snrBack": [12]}}
+        assert discoverer.parse_response(packet, decoded) == (
+            "!12345678",
+            10.5,
+            -50,
+            2.5,
+            0x78,
+        )
+
+        decoded = {"traceroute": {"snrTowards": [0], "snrBack": [12, 8]}}
+        assert discoverer.parse_response(packet, decoded) == (
+            "!12345678",
+            "Forwarded",
+            "Forwarded",
+            None,
+            0x78,
+        )
+
+    def test_on_traceroute_response_drops_duplicates(self):
+        """Test that a packet heard twice is only recorded once."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer.active = True
+        discoverer.console = Mock()
+
+        packet = {
+            "id": 42,
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+        }
+
+        discoverer.on_traceroute_response(packet, None)
+        discoverer.on_traceroute_response(dict(packet), None)
+        discoverer.on_traceroute_response(dict(packet, id=43), None)
+
+        assert discoverer.console.print.call_count == 2
+        assert list(discoverer.nearby_nodes) == ["!12345678"]
+
+    def test_on_traceroute_response_keeps_strongest_snr(self):
+        """Test that repeated responses from a node keep the best SNR."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer.active = True
+        discoverer.console = Mock()
+
+        packet = {
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxRssi": -50,
+        }
+
+        discoverer.on_traceroute_response(dict(packet, id=1, rxSnr=2.0), None)
+        discoverer.on_traceroute_response(dict(packet, id=2, rxSnr=7.5), None)
+        discoverer.on_traceroute_response(dict(packet, id=3, rxSnr=4.0), None)
+
+        assert len(discoverer.nearby_nodes) == 1
+        assert discoverer.nearby_nodes["!12345678"].snr == 7.5
+        assert discoverer._table_stale
+
+    def test_append_to_csv(self, tmp_path):
+        """Test that response records are written with their display fields."""
+        csv_file = tmp_path / "results.csv"
+        discoverer = NearbyNodeDiscoverer(csv_file=str(csv_file))
+        discoverer.known_nodes = {
+            "!12345678": {"short_name": "AB", "long_name": "Alpha", "node_num": 1},
+        }
+        nodes = [
+            discoverer.make_node_record("!12345678", 0x12345678, 10.5, -50, 2.25),
+            discoverer.make_node_record("!87654321", 0x87654321, 3.0, -90, None),
+        ]
+
+        with patch("meshctl.traceroute.click.echo"):
+            discoverer.append_to_csv(nodes)
+
+        lines = csv_file.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == (
+            "Timestamp,Node ID,Short Name,Long Name,SNR (dB),RSSI (dBm),"
+            "SNR Towards (dB)"
+        )
+        assert lines[1].endswith(",!12345678,AB,Alpha,10.5,-50,2.25")
+        assert lines[2].endswith(",!87654321,,,3.0,-90,")
+
+    def test_debug_prints_packet_summary(self):
+        """Test that debug mode prints a one-line packet summary."""
+        discoverer = NearbyNodeDiscoverer(debug=True)
+        discoverer.active = True
+        discoverer.console = Mock()
+
+        packet = {
+            "id": 42,
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+            "hopStart": 3,
+            "hopLimit": 3,
+        }
+        discoverer.on_traceroute_response(packet, None)
+
+        summary = discoverer.console.print.call_args.args[0]
+        assert str(summary) == (
+            "📦 Packet 42 from !12345678 port=TRACEROUTE_APP SNR=10.5dB "
+            "RSSI=-50dBm hops=3/3"
+        )
+
+    def test_verbose_packets_summarized_when_not_a_terminal(self):
+        """Test that full packet details are skipped for redirected output."""
+        discoverer = NearbyNodeDiscoverer(verbose_packets=True)
+        discoverer.active = True
+        discoverer.console = Mock(is_terminal=False)
+        discoverer.format_packet_details = Mock()
+
+        packet = {
+            "id": 42,
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+        }
+        discoverer.on_traceroute_response(packet, None)
+
+        discoverer.format_packet_details.assert_not_called()
+        summary = discoverer.console.print.call_args.args[0]
+        assert str(summary).startswith("📦 Packet 42 from !12345678")
+
+    @patch("pubsub.pub.unsubscribe")
+    @patch("pubsub.pub.subscribe")
+    def test_subscribe_responses_once(self, mock_subscribe, mock_unsubscribe):
+        """Test that repeated subscriptions register the handler only once."""
+        discoverer = NearbyNodeDiscoverer()
+
+        discoverer.subscribe_responses()
+        discoverer.subscribe_responses()
+        discoverer.unsubscribe_responses()
+        discoverer.unsubscribe_responses()
+
+        mock_subscribe.assert_called_once()
+        mock_unsubscribe.assert_called_once()
+
+    @patch("pubsub.pub.unsubscribe")
+    @patch("pubsub.pub.subscribe")
+    def test_discover_stops_at_max_nodes(self, mock_subscribe, mock_unsubscribe):
+        """Test that discovery returns as soon as max_nodes have responded."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer.connect = Mock(return_value=True)
+        discoverer.interface = Mock()
+        discoverer.interface.nodesByNum = {}
+
+        packet = {
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+        }
+
+        def send_traceroute(destination_id, hop_limit=0):
+            discoverer.on_traceroute_response(packet, None)
+            return Mock(id=1)
+
+        discoverer.send_traceroute = send_traceroute
+
+        start = time.monotonic()
+        nodes = discoverer.discover_nearby_nodes(duration=30, max_nodes=1)
+
+        assert len(nodes) == 1
+        assert time.monotonic() - start < 5
+
+    @patch("pubsub.pub.unsubscribe")
+    @patch("pubsub.pub.subscribe")
+    def test_discover_interrupt_keeps_results(self, mock_subscribe, mock_unsubscribe):
+        """Test that Ctrl-C stops listening but still reports the results."""
+        discoverer = NearbyNodeDiscoverer()
+        discoverer.connect = Mock(return_value=True)
+        discoverer.interface = Mock()
+        discoverer.interface.nodesByNum = {}
+
+        packet = {
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+        }
+
+        def send_traceroute(destination_id, hop_limit=0):
+            discoverer.on_traceroute_response(packet, None)
+            discoverer._on_interrupt(signal.SIGINT, None)
+            return Mock(id=1)
+
+        discoverer.send_traceroute = send_traceroute
+        previous_handler = signal.getsignal(signal.SIGINT)
+
+        start = time.monotonic()
+        with patch("meshctl.discover.click.echo") as mock_echo:
+            nodes = discoverer.discover_nearby_nodes(duration=30)
+
+        assert len(nodes) == 1
+        assert time.monotonic() - start < 5
+        mock_echo.assert_any_call("\n⏹️  Discovery interrupted by user")
+        assert signal.getsignal(signal.SIGINT) is previous_handler
+
+    @patch("pubsub.pub.unsubscribe")
+    @patch("pubsub.pub.subscribe")
+    def test_discover_restores_sigint_before_reporting(
+        self, mock_subscribe, mock_unsubscribe
+    ):
+        """Test that Ctrl-C works as usual again once listening has ended."""
+        discoverer = NearbyNodeDiscoverer(csv_file="results.csv")
+        discoverer.connect = Mock(return_value=True)
+        discoverer.interface = Mock()
+        discoverer.interface.nodesByNum = {}
+
+        packet = {
+            "decoded": {"portnum": "TRACEROUTE_APP"},
+            "fromId": "!12345678",
+            "from": 0x12345678,
+            "rxSnr": 10.5,
+            "rxRssi": -50,
+        }
+
+        def send_traceroute(destination_id, hop_limit=0):
+            discoverer.on_traceroute_response(packet, None)
+            return Mock(id=1)
+
+        handlers = []
+        discoverer.send_traceroute = send_traceroute
+        discoverer.append_to_csv = lambda nodes: handlers.append(
+            signal.getsignal(signal.SIGINT)
+        )
+        previous_handler = signal.getsignal(signal.SIGINT)
+
+        discoverer.discover_nearby_nodes(duration=30, max_nodes=1)
+
+        assert handlers == [previous_handler]
+
 
-def test_discover_command_help():
+def test_discover_command_help(runner):
     """Test discover command help output."""
-    runner = CliRunner()
     result = runner.invoke(discover, ["--help"])
 
     assert result.exit_code == 0
@@ -91,13 +433,12 @@ def test_discover_command_help():
 
 
 @patch("meshctl.discover.NearbyNodeDiscoverer")
-def test_discover_command_execution(mock_discoverer_class):
+def test_discover_command_execution(mock_discoverer_class, runner):
     """Test discover command execution."""
     mock_discoverer = Mock()
     mock_discoverer.discover_nearby_nodes.return_value = []
     mock_discoverer_class.return_value = mock_discoverer
 
-    runner = CliRunner()
     result = runner.invoke(discover, ["--duration", "1"])
 
     assert result.exit_code == 0
@@ -107,7 +448,8 @@ def test_discover_command_execution(mock_discoverer_class):
         debug=False,
         test_run_id=None,
         csv_file=None,
+        verbose_packets=False,
     )
     mock_discoverer.discover_nearby_nodes.assert_called_once_with(
-        duration=1, current_run=1, total_runs=1
+        duration=1, current_run=1, total_runs=1, max_nodes=None
     )
@@ -1,10 +1,12 @@
 """Tests for the list_nodes module."""
 
-from unittest.mock import Mock, patch
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import ANY, Mock, patch
 
-from click.testing import CliRunner
-
-from meshctl.list_nodes import NodeLister, list_nodes
+from meshctl.list_nodes import NodeLister, list_nodes, load_snapshot, save_snapshot
 
 
 class TestNodeLister:
@@ -23,7 +25,7 @@ class TestNodeLister:
         assert lister.interface_type == "tcp"
         assert lister.device_path == "test.local"
 
-    @patch("meshctl.list_nodes.connect")
+    @patch("meshctl.connection.connect")
     def test_connect_success(self, mock_connect):
         """Test successful connection."""
         mock_interface = Mock()
@@ -33,10 +35,12 @@ class TestNodeLister:
         result = lister.connect()
 
         assert result is True
-        mock_connect.assert_called_once_with(address=None, interface_type="serial")
+        mock_connect.assert_called_once_with(
+            address=None, interface_type="serial", echo=ANY
+        )
         mock_interface.waitForConfig.assert_called_once()
 
-    @patch("meshctl.list_nodes.connect")
+    @patch("meshctl.connection.connect")
     def test_connect_failure(self, mock_connect):
         """Test failed connection."""
         mock_connect.return_value = None
@@ -46,7 +50,7 @@ class TestNodeLister:
 
         assert result is False
 
-    @patch("meshctl.list_nodes.connect")
+    @patch("meshctl.connection.connect")
     def test_connect_with_params(self, mock_connect):
         """Test connection with specific parameters."""
         mock_interface = Mock()
@@ -56,10 +60,97 @@ class TestNodeLister:
         result = lister.connect()
 
         assert result is True
-        mock_connect.assert_called_once_with(address="test.local", interface_type="tcp")
+        mock_connect.assert_called_once_with(
+            address="test.local", interface_type="tcp", echo=ANY
+        )
         mock_interface.waitForConfig.assert_called_once()
 
-    @patch("meshctl.list_nodes.connect")
+    @patch("meshctl.connection.connect")
+    def test_connect_timeout_with_partial_database(self, mock_connect):
+        """Test that a config timeout still lists the nodes known so far."""
+        release = threading.Event()
+        mock_interface = Mock()
+        mock_interface.waitForConfig.side_effect = release.wait
+        mock_interface.nodesByNum = {0x22222222: {}}
+        mock_connect.return_value = mock_interface
+
+        lister = NodeLister(connect_timeout=0.01)
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            result = lister.connect()
+        release.set()
+
+        assert result is True
+        assert "may be partial" in mock_echo.call_args_list[0].args[0]
+
+    @patch("meshctl.connection._tcp_interface_class")
+    def test_connect_timeout_covers_the_handshake(self, mock_tcp_interface_class):
+        """Test that the timeout also bounds the handshake run on connect."""
+        release = threading.Event()
+        mock_interface = Mock()
+        mock_interface.nodesByNum = {0x22222222: {}}
+        # Like meshtastic, block while connecting unless told not to
+        mock_interface.connect.side_effect = lambda: release.wait(5)
+
+        def fake_tcp_interface(hostname, connectNow=True):
+            if connectNow:
+                mock_interface.connect()
+            return mock_interface
+
+        mock_tcp_interface_class.return_value.side_effect = fake_tcp_interface
+
+        lister = NodeLister(
+            interface_type="tcp", device_path="192.0.2.1", connect_timeout=0.01
+        )
+        start = time.monotonic()
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            result = lister.connect()
+        elapsed = time.monotonic() - start
+        release.set()
+
+        assert result is True
+        assert elapsed < 1
+        assert lister.config_complete is False
+        assert "may be partial" in mock_echo.call_args_list[0].args[0]
+
+    @patch("meshctl.connection.connect")
+    def test_partial_database_keeps_cached_snapshot(self, mock_connect):
+        """Test that a config timeout doesn't overwrite the cached nodes."""
+        save_snapshot({0x11111111: {}, 0x22222222: {}}, 0x11111111, address="radio")
+        release = threading.Event()
+        mock_interface = Mock()
+        mock_interface.waitForConfig.side_effect = release.wait
+        mock_interface.localNode.nodeNum = 0x11111111
+        mock_interface.nodesByNum = {0x11111111: {}}
+        mock_connect.return_value = mock_interface
+
+        lister = NodeLister(device_path="radio", connect_timeout=0.01)
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            lister.show_known_nodes()
+        release.set()
+
+        assert set(load_snapshot("radio")["nodes"]) == {0x11111111, 0x22222222}
+        messages = [c.args[0] for c in mock_echo.call_args_list]
+        assert any("Not updating the cached node database" in m for m in messages)
+
+    @patch("meshctl.connection.connect")
+    def test_connect_timeout_without_nodes(self, mock_connect):
+        """Test that a config timeout with nothing known fails to connect."""
+        release = threading.Event()
+        mock_interface = Mock()
+        mock_interface.waitForConfig.side_effect = release.wait
+        mock_interface.nodesByNum = {}
+        mock_connect.return_value = mock_interface
+
+        lister = NodeLister(connect_timeout=0.01)
+        with patch("meshctl.list_nodes.click.echo"):
+            result = lister.connect()
+        release.set()
+
+        assert result is False
+        assert lister.interface is None
+        mock_interface.close.assert_called_once()
+
+    @patch("meshctl.connection.connect")
     def test_show_known_nodes_empty_database(self, mock_connect):
         """Test showing known nodes with empty database."""
         mock_interface = Mock()
@@ -71,10 +162,12 @@ class TestNodeLister:
         with patch("meshctl.list_nodes.click.echo") as mock_echo:
             lister.show_known_nodes()
 
-        # Should indicate empty database
-        mock_echo.assert_any_call("  Node database is empty")
+        # Should indicate empty database, in the same write as the header
+        mock_echo.assert_called_with(
+            "📋 Currently known nodes in database:\n  Node database is empty"
+        )
 
-    @patch("meshctl.list_nodes.connect")
+    @patch("meshctl.connection.connect")
     def test_show_known_nodes_with_nodes(self, mock_connect):
         """Test showing known nodes with populated database."""
         mock_interface = Mock()
@@ -94,12 +187,169 @@ class TestNodeLister:
             lister.show_known_nodes()
 
         # Should show the node information
-        mock_echo.assert_any_call("  1. !22222222 (Test Node)")
+        output = "\n".join(call.args[0] for call in mock_echo.call_args_list)
+        assert "  1. !22222222 (Test Node)" in output
+        assert "SNR: 5.5dB" in output
+
+    @patch("meshctl.connection.connect")
+    def test_show_known_nodes_zero_snr(self, mock_connect):
+        """Test that an SNR of 0 dB is shown, and a missing user falls back."""
+        mock_interface = Mock()
+        mock_interface.localNode.nodeNum = 0x11111111
+        mock_interface.nodesByNum = {
+            0x22222222: {"snr": 0.0},
+            0x33333333: {"user": {"id": "!33333333"}},
+        }
+        mock_connect.return_value = mock_interface
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister().show_known_nodes()
+
+        output = "\n".join(call.args[0] for call in mock_echo.call_args_list)
+        assert "!22222222 (Unknown)\n     SNR: 0.0dB" in output
+        assert "!33333333 (Unknown)\n     SNR: Unknown" in output
+
+    @patch("meshctl.connection.connect")
+    def test_show_known_nodes_sorted_by_last_heard(self, mock_connect):
+        """Test that the most recently heard nodes are listed first."""
+        mock_interface = Mock()
+        mock_interface.localNode.nodeNum = 0x11111111
+        mock_interface.nodesByNum = {
+            0x11111111: {"user": {"id": "!11111111", "longName": "Local"}},
+            0x22222222: {
+                "user": {"id": "!22222222", "longName": "Old Node"},
+                "lastHeard": 1640995200,
+            },
+            0x33333333: {"user": {"id": "!33333333", "longName": "Never Heard"}},
+            0x44444444: {
+                "user": {"id": "!44444444", "longName": "New Node"},
+                "lastHeard": 1640999999,
+            },
+        }
+        mock_connect.return_value = mock_interface
+
+        lister = NodeLister()
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            lister.show_known_nodes()
+
+        output = "\n".join(call.args[0] for call in mock_echo.call_args_list)
+        assert "Local" not in output
+        assert (
+            output.index("New Node")
+            < output.index("Old Node")
+            < output.index("Never Heard")
+        )
+
+    @patch("meshctl.connection.connect")
+    def test_show_known_nodes_limit(self, mock_connect):
+        """Test that only the most recently heard nodes are listed."""
+        mock_interface = Mock()
+        mock_interface.localNode.nodeNum = 0x11111111
+        mock_interface.nodesByNum = {
+            num: {"user": {"longName": f"Node {num}"}, "lastHeard": 1640995200 + num}
+            for num in range(1, 6)
+        }
+        mock_connect.return_value = mock_interface
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister().show_known_nodes(limit=2)
+
+        output = "\n".join(call.args[0] for call in mock_echo.call_args_list)
+        assert "  1. !00000005 (Node 5)" in output
+        assert "  2. !00000004 (Node 4)" in output
+        assert "Node 3" not in output
+        assert "... and 3 more" in output
+
+    @patch("meshctl.connection.connect")
+    def test_show_known_nodes_saves_snapshot(self, mock_connect, cache_home):
+        """Test that a live listing is cached and can be shown offline."""
+        mock_interface = Mock()
+        mock_interface.localNode.nodeNum = 0x11111111
+        mock_interface.nodesByNum = {
+            0x11111111: {"user": {"id": "!11111111", "longName": "Local"}},
+            0x22222222: {
+                "user": {"id": "!22222222", "longName": "Test Node"},
+                "snr": 5.5,
+                "lastHeard": 1640995200,
+            },
+        }
+        mock_connect.return_value = mock_interface
+
+        with patch("meshctl.list_nodes.click.echo"):
+            NodeLister().show_known_nodes()
+
+        assert (cache_home / "meshctl" / "nodes-11111111.json").exists()
+        snapshot = load_snapshot("!11111111")
+        assert snapshot["local_num"] == 0x11111111
+        assert snapshot["nodes"][0x22222222]["snr"] == 5.5
+
+        mock_connect.reset_mock()
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister().show_known_nodes(cached=True)
+
+        mock_connect.assert_not_called()
+        output = "\n".join(call.args[0] for call in mock_echo.call_args_list)
+        assert "database of !11111111, cached at" in output
+        assert "  1. !22222222 (Test Node)" in output
+        assert "Local" not in output
+
+    def test_show_cached_nodes_per_radio(self):
+        """Test that --cached picks the snapshot saved for the given address."""
+
+        def node(name):
+            return {"user": {"id": "!33333333", "longName": name}}
+
+        save_snapshot({0x33333333: node("Seen by A")}, 0xAAAAAAAA, "/dev/ttyUSB0")
+        save_snapshot({0x33333333: node("Seen by B")}, 0xBBBBBBBB, "/dev/ttyUSB1")
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister(device_path="/dev/ttyUSB0").show_known_nodes(cached=True)
+        output = mock_echo.call_args.args[0]
+        assert "database of !aaaaaaaa via /dev/ttyUSB0" in output
+        assert "Seen by A" in output
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister(device_path="!bbbbbbbb").show_known_nodes(cached=True)
+        assert "Seen by B" in mock_echo.call_args.args[0]
+
+        # Without an address the choices are listed instead of guessing
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister().show_known_nodes(cached=True)
+        output = mock_echo.call_args.args[0]
+        assert "pick one with --address" in output
+        assert "!aaaaaaaa via /dev/ttyUSB0" in output
+        assert "!bbbbbbbb via /dev/ttyUSB1" in output
+        assert "Seen by" not in output
+
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister(device_path="/dev/ttyUSB2").show_known_nodes(cached=True)
+        assert "No cached node database for /dev/ttyUSB2" in (
+            mock_echo.call_args.args[0]
+        )
+
+    def test_show_cached_nodes_without_snapshot(self):
+        """Test --cached before any snapshot was saved."""
+        with patch("meshctl.list_nodes.click.echo") as mock_echo:
+            NodeLister().show_known_nodes(cached=True)
+
+        assert "No cached node database" in mock_echo.call_args.args[0]
+
+
+def test_import_does_not_load_meshtastic():
+    """Test that the CLI only imports meshtastic once a device is used."""
+    code = (
+        "import sys, meshctl.cli, meshctl.list_nodes; "
+        "print(any(m.split('.')[0] == 'meshtastic' for m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
 
 
-def test_list_nodes_command_help():
+def test_list_nodes_command_help(runner):
     """Test list-nodes command help output."""
-    runner = CliRunner()
     result = runner.invoke(list_nodes, ["--help"])
 
     assert result.exit_code == 0
@@ -109,18 +359,103 @@ def test_list_nodes_command_help():
 
 
 @patch("meshctl.list_nodes.NodeLister")
-def test_list_nodes_command_execution(mock_lister_class):
+def test_list_nodes_command_execution(mock_lister_class, runner):
     """Test list-nodes command execution."""
     mock_lister = Mock()
     mock_lister_class.return_value = mock_lister
 
-    runner = CliRunner()
     result = runner.invoke(
         list_nodes, ["--interface-type", "tcp", "--address", "test.local"]
     )
 
     assert result.exit_code == 0
     mock_lister_class.assert_called_once_with(
-        interface_type="tcp", device_path="test.local"
+        interface_type="tcp", device_path="test.local", connect_timeout=10.0
     )
-    mock_lister.show_known_nodes.assert_called_once()
+    mock_lister.show_known_nodes.assert_called_once_with(cached=False, limit=50)
+
+
+@patch("meshctl.list_nodes.NodeLister")
+def test_list_nodes_command_rejects_negative_limit(mock_lister_class, runner):
+    """Test that --limit can't be negative."""
+    result = runner.invoke(list_nodes, ["--limit", "-1"])
+
+    assert result.exit_code == 2
+    assert "--limit" in result.output
+    mock_lister_class.assert_not_called()
+
+
+@patch("meshctl.connection.connect")
+def test_list_nodes_command_multiple_devices(mock_connect, runner):
+    """Test that each device gets its own report, in the order given."""
+
+    def fake_connect(address, interface_type, echo):
+        interface = Mock()
+        interface.localNode.nodeNum = 0x11111111
+        interface.nodesByNum = {
+            0x22222222: {"user": {"id": "!22222222", "longName": f"Via {address}"}}
+        }
+        return interface
+
+    mock_connect.side_effect = fake_connect
+
+    result = runner.invoke(list_nodes, ["--address", "radio-a", "--address", "radio-b"])
+
+    assert result.exit_code == 0
+    assert mock_connect.call_count == 2
+    output = result.output
+    assert output.index("🔌 radio-a") < output.index("Via radio-a")
+    assert output.index("Via radio-a") < output.index("🔌 radio-b")
+    assert output.index("🔌 radio-b") < output.index("Via radio-b")
+
+
+@patch("meshctl.connection.connect")
+def test_list_nodes_command_multiple_devices_failure(mock_connect, runner):
+    """Test that connection messages are printed under their device."""
+
+    def fake_connect(address, interface_type, echo):
+        if address == "radio-b":
+            echo("Failed to connect: [Errno 113] No route to host", err=True)
+            return None
+        interface = Mock()
+        interface.localNode.nodeNum = 0x11111111
+        interface.nodesByNum = {}
+        return interface
+
+    mock_connect.side_effect = fake_connect
+
+    result = runner.invoke(
+        list_nodes,
+        ["--address", "radio-a", "--address", "radio-b", "--address", "radio-c"],
+    )
+
+    assert result.exit_code == 0
+    output = result.output
+    radio_b = output.index("🔌 radio-b")
+    assert output.index("🔌 radio-a") < output.index("Connected") < radio_b
+    assert radio_b < output.index("No route to host") < output.index("🔌 radio-c")
+    assert output.count("Node database is empty") == 2
+
+
+def test_list_nodes_command_multiple_devices_cached(runner):
+    """Test that --cached shows each device's own snapshot."""
+    save_snapshot({2: {"user": {"longName": "Seen by A"}}}, 0xA, "radio-a")
+    save_snapshot({2: {"user": {"longName": "Seen by B"}}}, 0xB, "radio-b")
+
+    result = runner.invoke(
+        list_nodes, ["--cached", "--address", "radio-a", "--address", "radio-b"]
+    )
+
+    assert result.exit_code == 0
+    output = result.output
+    assert output.index("🔌 radio-a") < output.index("Seen by A")
+    assert output.index("🔌 radio-b") < output.index("Seen by B")
+
+
+@patch("meshctl.list_nodes.in_shared_session", return_value=True)
+def test_list_nodes_command_multiple_devices_in_shell(mock_shared, runner):
+    """Test that several devices are rejected over the shell's connection."""
+    result = runner.invoke(list_nodes, ["--address", "radio-a", "--address", "b"])
+
+    assert result.exit_code != 0
+    assert "--address can only be given once" in result.output
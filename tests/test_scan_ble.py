@@ -2,22 +2,19 @@
 
 from unittest.mock import Mock, patch
 
-from click.testing import CliRunner
-
 from meshctl.scan_ble import scan_ble
 
 
-def test_scan_ble_command_help():
+def test_scan_ble_command_help(runner):
     """Test scan-ble command help output."""
-    runner = CliRunner()
     result = runner.invoke(scan_ble, ["--help"])
 
     assert result.exit_code == 0
     assert "Scan for Meshtastic BLE devices" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_success(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_success(mock_scan, runner):
     """Test successful BLE scan."""
     mock_device1 = Mock()
     mock_device1.name = "Meshtastic Device 1"
@@ -29,7 +26,6 @@ def test_scan_ble_success(mock_scan):
 
     mock_scan.return_value = [mock_device1, mock_device2]
 
-    runner = CliRunner()
     result = runner.invoke(scan_ble)
 
     assert result.exit_code == 0
@@ -40,12 +36,11 @@ def test_scan_ble_success(mock_scan):
     assert "11:22:33:44:55:66" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_no_devices(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_no_devices(mock_scan, runner):
     """Test BLE scan with no devices found."""
     mock_scan.return_value = []
 
-    runner = CliRunner()
     result = runner.invoke(scan_ble)
 
     assert result.exit_code == 0
@@ -53,12 +48,11 @@ def test_scan_ble_no_devices(mock_scan):
     assert "No BLE devices found" in result.output
 
 
-@patch("meshctl.scan_ble.meshtastic.ble_interface.BLEInterface.scan")
-def test_scan_ble_error(mock_scan):
+@patch("meshtastic.ble_interface.BLEInterface.scan")
+def test_scan_ble_error(mock_scan, runner):
     """Test BLE scan with error."""
     mock_scan.side_effect = Exception("Bluetooth not available")
 
-    runner = CliRunner()
     result = runner.invoke(scan_ble)
 
     assert result.exit_code == 0